@@ -3,26 +3,46 @@ This file contains the application factory for the TaskFlow Flask app.
 """
 
 import os
+import click
 from dotenv import load_dotenv
 from flask import Flask
 from flask_cors import CORS
 from flask_jwt_extended import JWTManager
+from flask_migrate import Migrate
+from werkzeug.middleware.proxy_fix import ProxyFix
 
 from .models import db, User
 from .api import api_bp
+from .scheduler import Scheduler
+from .compression import Compressor
+from .sharding import shard_router, SHARD_KEY_PREFIX
+from .profiling import RequestProfiler
+from .ratelimit import RateLimiter
+from .archive import archive_completed_tasks
+from .due import scan_due_tasks
+from .activity import activity_log, prune_activity, FLUSH_JOB
 
 load_dotenv()
 
-def create_app():
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'migrations')
+
+def create_app(config=None):
     """
     Application factory function.
     Initializes the Flask app, configures extensions, and registers blueprints.
+    config overrides the settings below before any extension reads them (e.g. in tests).
     """
     app = Flask(__name__)
 
     # --- Configuration ---
     app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///taskflow.db'
     app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+
+    # Optional sharding: a comma separated list of database URIs, one per shard.
+    # The default database above then only holds the global catalog (users, memberships, shard directory).
+    shard_uris = [uri.strip() for uri in os.environ.get('SHARD_DATABASE_URIS', '').split(',') if uri.strip()]
+    app.config['SHARD_KEYS'] = [f'{SHARD_KEY_PREFIX}{i}' for i in range(len(shard_uris))]
+    app.config['SQLALCHEMY_BINDS'] = dict(zip(app.config['SHARD_KEYS'], shard_uris))
     
     # Configuration for Flask-JWT-Extended
     app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'super-secret-key-change-me')
@@ -35,8 +55,60 @@ def create_app():
     app.config['JWT_CSRF_CHECK_FORM'] = False # We will use headers instead of form data for CSRF tokens
     app.config['JWT_TOKEN_LOCATION'] = ['cookies'] # Tokens will be stored in cookies
 
+    # Background maintenance jobs (set SCHEDULER_ENABLED=0 to only run them via `flask run-job`)
+    app.config['SCHEDULER_ENABLED'] = os.environ.get('SCHEDULER_ENABLED', '1') == '1'
+    app.config['ARCHIVE_INTERVAL_SECONDS'] = int(os.environ.get('ARCHIVE_INTERVAL_SECONDS', 3600))
+    app.config['ARCHIVE_BATCH_SIZE'] = int(os.environ.get('ARCHIVE_BATCH_SIZE', 500)) # Rows moved per transaction
+    app.config['DUE_SCAN_INTERVAL_SECONDS'] = int(os.environ.get('DUE_SCAN_INTERVAL_SECONDS', 300))
+    app.config['DUE_SCAN_BATCH_SIZE'] = int(os.environ.get('DUE_SCAN_BATCH_SIZE', 500)) # Notifications per transaction
+    app.config['DUE_SCAN_LOOKBACK_HOURS'] = int(os.environ.get('DUE_SCAN_LOOKBACK_HOURS', 24)) # How far back the first scan looks
+    app.config['DUE_SOON_HOURS'] = int(os.environ.get('DUE_SOON_HOURS', 24)) # "Due soon" means due within this many hours
+
+    # Activity log, written behind the requests in batches
+    app.config['ACTIVITY_FLUSH_SIZE'] = int(os.environ.get('ACTIVITY_FLUSH_SIZE', 200)) # Events per bulk insert
+    app.config['ACTIVITY_FLUSH_INTERVAL_SECONDS'] = int(os.environ.get('ACTIVITY_FLUSH_INTERVAL_SECONDS', 5))
+    app.config['ACTIVITY_RETENTION_DAYS'] = int(os.environ.get('ACTIVITY_RETENTION_DAYS', 180))
+    app.config['ACTIVITY_PRUNE_INTERVAL_SECONDS'] = int(os.environ.get('ACTIVITY_PRUNE_INTERVAL_SECONDS', 86400))
+
+    # Response compression (gzip, and brotli when installed)
+    app.config['COMPRESS_MIN_SIZE'] = int(os.environ.get('COMPRESS_MIN_SIZE', 1024)) # Bytes
+    app.config['COMPRESS_LEVEL'] = int(os.environ.get('COMPRESS_LEVEL', 6)) # gzip level (1-9)
+    app.config['COMPRESS_BR_LEVEL'] = int(os.environ.get('COMPRESS_BR_LEVEL', 4)) # brotli quality (0-11)
+    app.config['COMPRESS_CACHE_SIZE'] = int(os.environ.get('COMPRESS_CACHE_SIZE', 128)) # Cached compressed payloads
+
+    # On-demand request profiling, off by default (no overhead when disabled)
+    app.config['PROFILING_ENABLED'] = os.environ.get('PROFILING_ENABLED', '0') == '1'
+    app.config['PROFILING_SAMPLE_RATE'] = float(os.environ.get('PROFILING_SAMPLE_RATE', 0.0)) # Also profile this fraction of all requests
+
+    # Rate limits per endpoint class ("<count>/<second|minute|hour>", None = unlimited) and a per-worker concurrency cap
+    app.config['RATELIMIT_LIMITS'] = { # Per logged-in user
+        'write': os.environ.get('RATELIMIT_WRITE', '120/minute'), # POST/PUT/PATCH/DELETE
+        'read': os.environ.get('RATELIMIT_READ') or None,
+    }
+    app.config['RATELIMIT_IP_LIMITS'] = { # Per client IP, for anonymous requests (may be a whole office behind NAT)
+        'auth': os.environ.get('RATELIMIT_AUTH', '30/minute'), # Login and register
+        'write': os.environ.get('RATELIMIT_IP_WRITE', '300/minute'),
+        'read': os.environ.get('RATELIMIT_IP_READ') or None,
+    }
+    # Number of reverse proxies in front of the app, whose X-Forwarded-For entries are trusted (0 = none)
+    app.config['TRUSTED_PROXY_COUNT'] = int(os.environ.get('TRUSTED_PROXY_COUNT', 0))
+    app.config['MAX_CONCURRENT_REQUESTS'] = int(os.environ.get('MAX_CONCURRENT_REQUESTS', 0)) # 0 = no cap
+
+    if config:
+        app.config.update(config)
+
+    # --- Client address behind reverse proxies (used by the rate limits) ---
+    if app.config['TRUSTED_PROXY_COUNT'] > 0:
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=app.config['TRUSTED_PROXY_COUNT'])
+
     # --- Initialize Extensions ---
     db.init_app(app) # Initialize SQLAlchemy with the app
+    Migrate(app, db, directory=MIGRATIONS_DIR) # Schema changes for existing databases (flask db upgrade)
+    shard_router.init_app(app) # Route per-project tables to their shard (no-op without shards)
+    RateLimiter(app) # First request hook, so rejected requests cost as little as possible
+    RequestProfiler(app) # Must come after the engines exist, it listens to their SQL
+    activity_log.init_app(app) # Buffers activity events and writes them in batches
+    Compressor(app) # Compress large responses
     CORS(app, resources={r"/api/*": {"origins": "http://localhost:5173"}}, supports_credentials=True)
     
     # --- Setup Flask-JWT-Extended ---
@@ -45,4 +117,28 @@ def create_app():
     # --- Register Blueprints ---
     app.register_blueprint(api_bp)
 
+    # --- Scheduled Jobs ---
+    scheduler = Scheduler(app)
+    scheduler.add_job('archive-tasks', app.config['ARCHIVE_INTERVAL_SECONDS'], archive_completed_tasks, exclusive=True)
+    scheduler.add_job('scan-due-tasks', app.config['DUE_SCAN_INTERVAL_SECONDS'], scan_due_tasks, exclusive=True)
+    scheduler.add_job(FLUSH_JOB, app.config['ACTIVITY_FLUSH_INTERVAL_SECONDS'], activity_log.flush) # Every worker flushes its own buffer
+    scheduler.add_job('prune-activity', app.config['ACTIVITY_PRUNE_INTERVAL_SECONDS'], prune_activity, exclusive=True)
+
+    register_commands(app)
+
     return app
+
+def register_commands(app):
+    """Registers the app's own CLI commands."""
+
+    @app.cli.command('set-admin')
+    @click.argument('email')
+    @click.option('--revoke', is_flag=True, help='Remove admin rights instead.')
+    def set_admin_command(email, revoke):
+        """Grants (or revokes) admin rights to a user."""
+        user = User.query.filter_by(email=email).first()
+        if not user:
+            raise click.ClickException(f'User with email {email} not found')
+        user.is_admin = not revoke
+        db.session.commit()
+        click.echo(f"{email} is {'no longer' if revoke else 'now'} an admin")
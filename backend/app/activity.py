@@ -0,0 +1,142 @@
+"""
+This file contains the project activity log ("who moved what").
+
+Writing an audit row inside every mutation would double the cost of our hottest
+endpoints, so routes only append events to an in-process buffer. The buffer is
+written with one bulk insert per shard by the scheduler thread, every
+ACTIVITY_FLUSH_INTERVAL_SECONDS and as soon as it reaches ACTIVITY_FLUSH_SIZE events
+(the request that fills it only wakes the scheduler up), and at interpreter shutdown.
+Events therefore show up in GET /api/projects/<id>/activity a few seconds late,
+and a hard crash loses at most one buffer.
+
+A retention job deletes events older than ACTIVITY_RETENTION_DAYS in chunks.
+"""
+
+import atexit
+import json
+import logging
+import threading
+from datetime import datetime, timedelta
+
+from flask import current_app, g, has_app_context
+
+from .models import db, ActivityLog
+from .sharding import shard_router
+
+logger = logging.getLogger(__name__)
+
+FLUSH_JOB = 'flush-activity' # Name of the scheduler job writing the buffer
+
+class ActivityBuffer:
+    """Collects activity events in memory and writes them in batches."""
+
+    def __init__(self, app=None):
+        self.app = None
+        self._events = []
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock() # Held while buffered events are being written
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('ACTIVITY_FLUSH_SIZE', 200) # Events buffered before a flush
+        app.config.setdefault('ACTIVITY_FLUSH_INTERVAL_SECONDS', 5)
+        app.config.setdefault('ACTIVITY_MAX_BUFFER', 10000) # Events kept when the database is unavailable
+        app.config.setdefault('ACTIVITY_RETENTION_DAYS', 180)
+        app.config.setdefault('ACTIVITY_PRUNE_BATCH_SIZE', 1000) # Rows deleted per transaction
+
+        self.app = app
+        app.extensions['activity_log'] = self
+        atexit.register(self.flush) # Do not lose the last events on shutdown
+
+    def record(self, project_id, action, user_id=None, task_id=None, details=None):
+        """Queues an event. Must be called while the project's shard is selected."""
+        event = {
+            'project_id': project_id,
+            'task_id': task_id,
+            'user_id': int(user_id) if user_id is not None else None,
+            'action': action,
+            'details': json.dumps(details) if details else None,
+            'created_at': datetime.utcnow(),
+        }
+        shard_key = g.get('shard_key') if has_app_context() else None
+
+        with self._lock:
+            self._events.append((shard_key, event))
+            full = len(self._events) >= self.app.config['ACTIVITY_FLUSH_SIZE']
+        if full and not self._request_flush():
+            self.flush() # No scheduler thread to hand the write to (e.g. SCHEDULER_ENABLED=0)
+
+    def _request_flush(self):
+        """Wakes the scheduler thread up to run the flush job. Returns False if it is not running."""
+        scheduler = self.app.extensions.get('scheduler')
+        return scheduler is not None and scheduler.trigger(FLUSH_JOB)
+
+    def discard_project(self, project_id):
+        """
+        Drops the buffered events of a deleted project, so they are not written after its log
+        was deleted. Waits for a flush in progress, which may be writing some of them.
+        Events buffered by other worker processes can still land later (activity_log.project_id
+        has no foreign key for that reason); nobody can see them and the retention job deletes them.
+        """
+        with self._flush_lock, self._lock:
+            self._events = [(key, event) for key, event in self._events if event['project_id'] != project_id]
+
+    def flush(self):
+        """Writes every buffered event, one bulk insert per shard. Returns the number written."""
+        with self._flush_lock:
+            return self._flush()
+
+    def _flush(self):
+        with self._lock:
+            events, self._events = self._events, []
+        if not events:
+            return 0
+
+        by_shard = {}
+        for shard_key, event in events:
+            by_shard.setdefault(shard_key, []).append(event)
+
+        written = 0
+        with self.app.app_context():
+            for shard_key, rows in by_shard.items():
+                try:
+                    with shard_router.engine_for(shard_key).begin() as connection:
+                        connection.execute(ActivityLog.__table__.insert(), rows)
+                    written += len(rows)
+                except Exception:
+                    logger.exception('Could not write %d activity events, keeping them for the next flush', len(rows))
+                    self._requeue(shard_key, rows)
+        return written
+
+    def _requeue(self, shard_key, rows):
+        with self._lock:
+            self._events[:0] = [(shard_key, row) for row in rows]
+            overflow = len(self._events) - self.app.config['ACTIVITY_MAX_BUFFER']
+            if overflow > 0:
+                del self._events[:overflow] # Drop the oldest events rather than grow forever
+                logger.error('Activity buffer full, dropped %d events', overflow)
+
+def prune_activity():
+    """Scheduled job: deletes events past the retention period in chunks. Returns the number deleted."""
+    config = current_app.config
+    cutoff = datetime.utcnow() - timedelta(days=config['ACTIVITY_RETENTION_DAYS'])
+    batch_size = config['ACTIVITY_PRUNE_BATCH_SIZE']
+    deleted = 0
+
+    for shard_key in shard_router.each_shard():
+        while True:
+            ids = [row_id for (row_id,) in db.session.query(ActivityLog.id).filter(
+                ActivityLog.created_at < cutoff
+            ).limit(batch_size)]
+            if not ids:
+                break
+            ActivityLog.query.filter(ActivityLog.id.in_(ids)).delete(synchronize_session=False)
+            db.session.commit() # Short transactions, so writers are never blocked for long
+            deleted += len(ids)
+            if len(ids) < batch_size:
+                break
+
+    return deleted
+
+activity_log = ActivityBuffer()
@@ -2,8 +2,8 @@
 This file initializes the API Blueprint and the Flask-RESTful Api object.
 
 It creates a Blueprint named 'api' and attaches a RESTful Api instance to it.
-It then imports the route modules from this directory (auth_routes, project_routes, task_routes)
-so that their @api.resource decorators can be registered.
+It then imports the route modules from this directory (auth_routes, project_routes, task_routes,
+archive_routes, activity_routes, admin_routes) so that their @api.resource decorators can be registered.
 """
 
 from flask import Blueprint
@@ -13,4 +13,4 @@ api_bp = Blueprint('api', __name__, url_prefix='/api') # API Blueprint, with URL
 
 api = Api(api_bp) # Flask-RESTful Api instance, attached to the api_bp Blueprint
 
-from . import auth_routes, project_routes, task_routes
+from . import auth_routes, project_routes, task_routes, archive_routes, activity_routes, admin_routes
@@ -0,0 +1,96 @@
+"""
+This file defines the RESTful API routes for the project activity log.
+- /api/projects/<id>/activity (GET)
+"""
+
+import json
+
+from flask import request
+from flask_restful import Resource
+from flask_jwt_extended import jwt_required, get_jwt_identity
+from sqlalchemy.orm import joinedload
+
+from . import api
+from ..models import db, ProjectMember, ActivityLog
+from ..sharding import shard_router
+from .project_routes import serialize_user_simple
+from .task_routes import parse_iso_date
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+# --- Helper Functions ---
+
+def serialize_activity(event):
+    """Converts an ActivityLog model object into a JSON-serializable dictionary."""
+    return {
+        'id': event.id,
+        'action': event.action,
+        'task_id': event.task_id,
+        'user': serialize_user_simple(event.user) if event.user else None,
+        'details': json.loads(event.details) if event.details else {},
+        'created_at': event.created_at.isoformat()
+    }
+
+# --- Resource Classes ---
+
+class ProjectActivityResource(Resource):
+    """
+    Handles the activity feed of a project.
+    - GET /api/projects/<int:project_id>/activity?per_page=50&before=<created_at>&before_id=<id>
+    """
+    @jwt_required()
+    def get(self, project_id):
+        """
+        Gets one page of the project's activity, newest first.
+        Pass the 'next' cursor of a page as before/before_id to get the following page.
+        """
+        current_user_id = get_jwt_identity()
+
+        # --- SECURITY CHECK ---
+        membership = ProjectMember.query.filter_by(
+            user_id=current_user_id,
+            project_id=project_id
+        ).first()
+
+        if not membership:
+            return {'message': 'Unauthorized'}, 403 # Forbidden
+
+        if not shard_router.bind_project(project_id):
+            return {'message': 'Project not found'}, 404
+
+        try:
+            per_page = min(int(request.args.get('per_page', DEFAULT_PAGE_SIZE)), MAX_PAGE_SIZE)
+            before_id = int(request.args['before_id']) if 'before_id' in request.args else None
+        except ValueError:
+            return {'message': 'per_page and before_id must be integers'}, 400 # Bad Request
+        if per_page < 1:
+            return {'message': 'per_page must be positive'}, 400 # Bad Request
+
+        # Keyset pagination over ix_activity_log_project_created, no OFFSET scans on a growing log
+        query = ActivityLog.query.options(
+            joinedload(ActivityLog.user)
+        ).filter(ActivityLog.project_id == project_id)
+
+        if 'before' in request.args:
+            before = parse_iso_date(request.args['before'])
+            if not before or before_id is None:
+                return {'message': 'before must be an ISO date and comes with before_id'}, 400 # Bad Request
+            query = query.filter(db.or_(
+                ActivityLog.created_at < before,
+                db.and_(ActivityLog.created_at == before, ActivityLog.id < before_id)
+            ))
+
+        events = query.order_by(
+            ActivityLog.created_at.desc(), ActivityLog.id.desc()
+        ).limit(per_page + 1).all()
+
+        page = events[:per_page]
+        has_next = len(events) > per_page
+        return {
+            'items': [serialize_activity(e) for e in page],
+            'next': {'before': page[-1].created_at.isoformat(), 'before_id': page[-1].id} if has_next else None
+        }, 200
+
+# --- Register the resources with our API ---
+api.add_resource(ProjectActivityResource, '/projects/<int:project_id>/activity')
@@ -0,0 +1,95 @@
+"""
+This file defines the RESTful API routes for administrators.
+- /api/admin/profiles (GET)
+- /api/admin/profiles/<id> (GET)
+- /api/admin/profiles/<id>/pstats (GET)
+- /api/admin/ratelimit (GET)
+"""
+
+import os
+
+from flask import current_app, send_file
+from flask_restful import Resource
+from flask_jwt_extended import jwt_required, get_jwt_identity
+
+from . import api
+from ..models import User
+
+# --- Helper Functions ---
+
+def is_admin(user_id):
+    """Returns True if the user exists and is an administrator."""
+    user = User.query.get(user_id)
+    return bool(user and user.is_admin)
+
+# --- Resource Classes ---
+
+class RequestProfileListResource(Resource):
+    """
+    Handles the list of saved request profiles.
+    - GET /api/admin/profiles
+    """
+    @jwt_required()
+    def get(self):
+        """Gets the summaries of the recent request profiles, newest first."""
+        if not is_admin(get_jwt_identity()):
+            return {'message': 'Admin access required'}, 403 # Forbidden
+
+        profiler = current_app.extensions['profiler']
+        return {
+            'enabled': current_app.config['PROFILING_ENABLED'],
+            'profiles': profiler.list_profiles()
+        }, 200
+
+class RequestProfileResource(Resource):
+    """
+    Handles a single saved request profile.
+    - GET /api/admin/profiles/<profile_id>
+    """
+    @jwt_required()
+    def get(self, profile_id):
+        """Gets a profile's report: request details, SQL statements with timings and top functions."""
+        if not is_admin(get_jwt_identity()):
+            return {'message': 'Admin access required'}, 403 # Forbidden
+
+        report = current_app.extensions['profiler'].load_profile(profile_id)
+        if not report:
+            return {'message': 'Profile not found'}, 404 # Not Found
+        return report, 200
+
+class RequestProfileStatsResource(Resource):
+    """
+    Handles downloading the raw profiler output.
+    - GET /api/admin/profiles/<profile_id>/pstats
+    """
+    @jwt_required()
+    def get(self, profile_id):
+        """Downloads the pstats file of a profile (for snakeviz, flameprof, ...)."""
+        if not is_admin(get_jwt_identity()):
+            return {'message': 'Admin access required'}, 403 # Forbidden
+
+        path = current_app.extensions['profiler'].profile_path(profile_id, 'prof')
+        if not path or not os.path.exists(path):
+            return {'message': 'Profile not found'}, 404 # Not Found
+
+        return send_file(path, mimetype='application/octet-stream', as_attachment=True,
+                         download_name=f'{profile_id}.prof')
+
+class RateLimitStatsResource(Resource):
+    """
+    Handles the rate limiter and admission control counters.
+    - GET /api/admin/ratelimit
+    """
+    @jwt_required()
+    def get(self):
+        """Gets this worker's in-flight requests and rejection counters."""
+        if not is_admin(get_jwt_identity()):
+            return {'message': 'Admin access required'}, 403 # Forbidden
+
+        return current_app.extensions['rate_limiter'].snapshot(), 200
+
+# --- Register the resources with our API ---
+api.add_resource(RequestProfileListResource, '/admin/profiles')
+api.add_resource(RequestProfileResource, '/admin/profiles/<string:profile_id>')
+api.add_resource(RequestProfileStatsResource, '/admin/profiles/<string:profile_id>/pstats')
+api.add_resource(RateLimitStatsResource, '/admin/ratelimit')
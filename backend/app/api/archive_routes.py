@@ -0,0 +1,232 @@
+"""
+This file defines the RESTful API routes for the task archive.
+- /api/projects/<id>/archive-policy (GET, PUT)
+- /api/projects/<id>/archived-tasks (GET)
+- /api/projects/<id>/archived-tasks/<id>/restore (POST)
+"""
+
+from flask import request
+from flask_restful import Resource
+from flask_jwt_extended import jwt_required, get_jwt_identity
+from sqlalchemy.orm import joinedload
+
+from . import api
+from ..models import db, Task, ProjectMember, ArchivePolicy, ArchivedTask
+from ..sharding import shard_router
+from .project_routes import serialize_task, serialize_user_simple
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+# --- Helper Functions ---
+
+def serialize_archive_policy(policy):
+    """Converts an ArchivePolicy model object into a dictionary."""
+    return {
+        'project_id': policy.project_id,
+        'enabled': policy.enabled,
+        'done_after_days': policy.done_after_days
+    }
+
+def serialize_archived_task(archived):
+    """Converts an ArchivedTask model object into a JSON-serializable dictionary."""
+    return {
+        'id': archived.id,
+        'task_id': archived.task_id,
+        'title': archived.title,
+        'description': archived.description,
+        'status': archived.status,
+        'project_id': archived.project_id,
+        'expiry_date': archived.expiry_date.isoformat() if archived.expiry_date else None,
+        'completed_at': archived.completed_at.isoformat() if archived.completed_at else None,
+        'archived_at': archived.archived_at.isoformat(),
+        'creator': serialize_user_simple(archived.creator) if archived.creator else None,
+        'assignees': archived.assignees
+    }
+
+def parse_pagination():
+    """Reads ?page= and ?per_page= from the query string, returns (page, per_page) or None if invalid."""
+    try:
+        page = int(request.args.get('page', 1))
+        per_page = int(request.args.get('per_page', DEFAULT_PAGE_SIZE))
+    except ValueError:
+        return None
+    if page < 1 or per_page < 1:
+        return None
+    return page, min(per_page, MAX_PAGE_SIZE)
+
+# --- Resource Classes ---
+
+class ArchivePolicyResource(Resource):
+    """
+    Handles the archive policy of a project.
+    - GET /api/projects/<int:project_id>/archive-policy
+    - PUT /api/projects/<int:project_id>/archive-policy
+    """
+    @jwt_required()
+    def get(self, project_id):
+        """Gets the project's archive policy (disabled if none was ever set)."""
+        current_user_id = get_jwt_identity()
+
+        # --- SECURITY CHECK ---
+        membership = ProjectMember.query.filter_by(
+            user_id=current_user_id,
+            project_id=project_id
+        ).first()
+
+        if not membership:
+            return {'message': 'Unauthorized'}, 403
+
+        if not shard_router.bind_project(project_id):
+            return {'message': 'Project not found'}, 404
+
+        policy = ArchivePolicy.query.filter_by(project_id=project_id).first()
+        if not policy:
+            return {'project_id': project_id, 'enabled': False, 'done_after_days': None}, 200
+
+        return serialize_archive_policy(policy), 200
+
+    @jwt_required()
+    def put(self, project_id):
+        """
+        Creates or updates the project's archive policy.
+        Only 'owner' role can do this.
+        Expects JSON: { "enabled": true, "done_after_days": 30 }
+        """
+        current_user_id = get_jwt_identity()
+
+        # --- SECURITY CHECK ---
+        membership = ProjectMember.query.filter_by(
+            user_id=current_user_id,
+            project_id=project_id
+        ).first()
+
+        if not membership:
+            return {'message': 'Unauthorized'}, 403
+
+        # --- ROLE-BASED CHECK ---
+        if membership.role != 'owner':
+            return {'message': 'Only the project owner can change the archive policy'}, 403
+
+        if not shard_router.bind_project(project_id):
+            return {'message': 'Project not found'}, 404
+
+        data = request.get_json()
+        policy = ArchivePolicy.query.filter_by(project_id=project_id).first()
+        if not policy:
+            policy = ArchivePolicy(project_id=project_id, enabled=True, done_after_days=30)
+            db.session.add(policy)
+
+        if 'done_after_days' in data:
+            days = data['done_after_days']
+            if not isinstance(days, int) or isinstance(days, bool) or days < 0:
+                return {'message': 'done_after_days must be a non-negative integer'}, 400 # Bad Request
+            policy.done_after_days = days
+
+        if 'enabled' in data:
+            policy.enabled = bool(data['enabled'])
+
+        db.session.commit()
+
+        return serialize_archive_policy(policy), 200
+
+class ArchivedTaskListResource(Resource):
+    """
+    Handles browsing the archive of a project.
+    - GET /api/projects/<int:project_id>/archived-tasks?page=1&per_page=50
+    """
+    @jwt_required()
+    def get(self, project_id):
+        """Gets one page of archived tasks, most recently archived first."""
+        current_user_id = get_jwt_identity()
+
+        # --- SECURITY CHECK ---
+        membership = ProjectMember.query.filter_by(
+            user_id=current_user_id,
+            project_id=project_id
+        ).first()
+
+        if not membership:
+            return {'message': 'Unauthorized'}, 403
+
+        if not shard_router.bind_project(project_id):
+            return {'message': 'Project not found'}, 404
+
+        pagination = parse_pagination()
+        if not pagination:
+            return {'message': 'page and per_page must be positive integers'}, 400 # Bad Request
+        page, per_page = pagination
+
+        # Fetch one extra row to know whether there is a next page without a COUNT(*)
+        rows = ArchivedTask.query.options(
+            joinedload(ArchivedTask.creator)
+        ).filter_by(
+            project_id=project_id
+        ).order_by(
+            ArchivedTask.archived_at.desc(), ArchivedTask.id.desc()
+        ).offset((page - 1) * per_page).limit(per_page + 1).all()
+
+        return {
+            'items': [serialize_archived_task(a) for a in rows[:per_page]],
+            'page': page,
+            'per_page': per_page,
+            'has_next': len(rows) > per_page
+        }, 200
+
+class ArchivedTaskRestoreResource(Resource):
+    """
+    Handles restoring an archived task to the board.
+    - POST /api/projects/<int:project_id>/archived-tasks/<int:archived_task_id>/restore
+    """
+    @jwt_required()
+    def post(self, project_id, archived_task_id):
+        """
+        Moves an archived task back into the hot table, at the end of its column.
+        """
+        current_user_id = get_jwt_identity()
+
+        # --- SECURITY CHECK ---
+        membership = ProjectMember.query.filter_by(
+            user_id=current_user_id,
+            project_id=project_id
+        ).first()
+
+        if not membership:
+            return {'message': 'Unauthorized'}, 403 # Forbidden
+
+        if not shard_router.bind_project(project_id):
+            return {'message': 'Project not found'}, 404
+
+        archived = ArchivedTask.query.filter_by(id=archived_task_id, project_id=project_id).first()
+        if not archived:
+            return {'message': 'Archived task not found'}, 404 # Not Found
+
+        max_order = db.session.query(db.func.max(Task.order)).filter_by(
+            project_id=archived.project_id,
+            status=archived.status
+        ).scalar()
+
+        # Setting status to DONE restarts the completed_at clock,
+        # so the task is not swept straight back into the archive
+        task = Task(
+            id=shard_router.allocate_task_id(archived.project_id), # Globally unique id when sharding is enabled
+            title=archived.title,
+            description=archived.description,
+            status=archived.status,
+            order=(max_order or 0) + 1,
+            expiry_date=archived.expiry_date,
+            assignees_text=archived.assignees_text,
+            creator_id=archived.creator_id,
+            project_id=archived.project_id
+        )
+        db.session.add(task)
+        db.session.delete(archived)
+        shard_router.forget_task(archived.task_id) # Tasks archived by older versions still hold their old id there
+        db.session.commit()
+
+        return serialize_task(task), 201 # Created
+
+# --- Register the resources with our API ---
+api.add_resource(ArchivePolicyResource, '/projects/<int:project_id>/archive-policy')
+api.add_resource(ArchivedTaskListResource, '/projects/<int:project_id>/archived-tasks')
+api.add_resource(ArchivedTaskRestoreResource, '/projects/<int:project_id>/archived-tasks/<int:archived_task_id>/restore')
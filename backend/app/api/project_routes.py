@@ -2,40 +2,92 @@
 This file defines the RESTful API routes for Projects.
 - /api/projects (GET, POST)
 - /api/projects/<id> (GET, PUT, DELETE)
+- /api/projects/<id>/members (GET, POST)
+- /api/projects/<id>/members/bulk (POST)
+- /api/projects/<id>/members/<user_id> (PUT, DELETE)
 """
 
 from flask import request
 from flask_restful import Resource
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from sqlalchemy.orm import joinedload
-from sqlalchemy.orm import joinedload, selectinload
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import joinedload, selectinload, load_only
 from datetime import datetime
 import json
 
 from . import api
-from ..models import db, Project, Task, User, ProjectMember
+from ..models import db, Project, Task, User, ProjectMember, ActivityLog
+from ..sharding import shard_router
+from ..activity import activity_log
 
-# --- Helper Functions for Serialization ---
+DEFAULT_MEMBER_PAGE_SIZE = 100
+MAX_MEMBER_PAGE_SIZE = 500
+MAX_BULK_INVITES = 1000
+BULK_INVITE_ATTEMPTS = 3 # Inserts retried after losing a race with a concurrent invite
 
-def serialize_task(task):
-    """Converts a Task model object into a JSON-serializable dictionary.""" 
-    return {
-        'id': task.id,
-        'title': task.title,
-        'description': task.description,
-        'status': task.status,
-        'order': task.order,
-        'project_id': task.project_id,
+# --- Helper Functions for Serialization ---
 
+# Every field a serialized task can have, in output order,
+# mapped to the Task columns that have to be loaded to build it.
+# This lets ?fields= push the column list down into the SQL query.
+TASK_FIELD_COLUMNS = {
+    'id': ['id'],
+    'title': ['title'],
+    'description': ['description'],
+    'status': ['status'],
+    'order': ['order'],
+    'project_id': ['project_id'],
+    'expiry_date': ['expiry_date'],
+    'creator': ['creator_id'],
+    'assignees': ['assignees_text'],
+    'version': ['version'],
+}
+TASK_FIELDS = list(TASK_FIELD_COLUMNS)
+
+def parse_task_fields(raw_fields):
+    """
+    Parses a ?fields=id,title,status value into a list of task fields (in output order).
+    Returns None when no selection was made (all fields). Raises ValueError on unknown fields.
+    """
+    if not raw_fields:
+        return None
+    requested = {f.strip() for f in raw_fields.split(',') if f.strip()}
+    if not requested:
+        return None
+    unknown = requested - set(TASK_FIELDS)
+    if unknown:
+        raise ValueError(f"Unknown task fields: {', '.join(sorted(unknown))}")
+    return [f for f in TASK_FIELDS if f in requested]
+
+def task_load_options(fields=None, load_creator=True):
+    """Builds the query options that load only the columns (and relationships) the fields need."""
+    if fields is None:
+        return [joinedload(Task.creator)] if load_creator else []
+    columns = {'id'}
+    for field in fields:
+        columns.update(TASK_FIELD_COLUMNS[field])
+    options = [load_only(*[getattr(Task, c) for c in sorted(columns)])]
+    if load_creator and 'creator' in fields:
+        options.append(joinedload(Task.creator).load_only(User.id, User.email))
+    return options
+
+def serialize_task_field(task, field):
+    """Returns the JSON value of a single task field."""
+    if field == 'expiry_date':
         # Convert expiry_date to ISO format string if it exists
-        'expiry_date': task.expiry_date.isoformat() if task.expiry_date else None,
-        
+        return task.expiry_date.isoformat() if task.expiry_date else None
+    if field == 'creator':
         # Include the creator's details
-        'creator': serialize_user_simple(task.creator) if task.creator else None,
-        
-        # Include the list of assignees
-        'assignees': task.assignees
-    }
+        return serialize_user_simple(task.creator) if task.creator else None
+    # Includes 'assignees', the list of assignees
+    return getattr(task, field)
+
+def serialize_task(task, fields=None):
+    """
+    Converts a Task model object into a JSON-serializable dictionary.
+    Only the given fields are included (all of them by default).
+    """
+    return {field: serialize_task_field(task, field) for field in (fields or TASK_FIELDS)}
 
 def serialize_user_simple(user):
     """Converts a User model object (as a member) into a dictionary."""
@@ -46,6 +98,16 @@ def serialize_user_simple(user):
         'email': user.email
     }
 
+def serialize_members(member_associations):
+    """Converts ProjectMember association objects into a list of member dictionaries with roles."""
+    members = []
+    for assoc in member_associations:
+        member_data = serialize_user_simple(assoc.user)
+        if member_data:
+            member_data['role'] = assoc.role
+            members.append(member_data)
+    return members
+
 def serialize_project(project, include_tasks=False, include_members=False):
     """Converts a Project model object into a dictionary."""
     data = {
@@ -61,15 +123,35 @@ def serialize_project(project, include_tasks=False, include_members=False):
     
     if include_members:
         # We now serialize the association object to include the role
-        data['members'] = []
-        for assoc in project.member_associations:
-            member_data = serialize_user_simple(assoc.user)
-            if member_data:
-                member_data['role'] = assoc.role
-                data['members'].append(member_data)
+        data['members'] = serialize_members(project.member_associations)
 
     return data
 
+def serialize_board_columnar(project, tasks, users, fields=None, include_members=True):
+    """
+    Converts a project board into the compact "columnar" format.
+    Users are sent once in a lookup table (id -> email), members and task creators
+    reference them by id, and tasks are sent as arrays grouped by status,
+    with their keys listed once in 'task_columns'.
+    """
+    fields = fields or TASK_FIELDS
+    data = {
+        'id': project.id,
+        'name': project.name,
+        'description': project.description,
+        'users': {str(user.id): user.email for user in users},
+        'members': [[assoc.user_id, assoc.role] for assoc in project.member_associations] if include_members else None,
+        'task_columns': fields,
+        'tasks': {},
+    }
+    for task in tasks: # Tasks are already sorted by status and order
+        row = [
+            task.creator_id if field == 'creator' else serialize_task_field(task, field)
+            for field in fields
+        ]
+        data['tasks'].setdefault(task.status, []).append(row)
+    return data
+
 # --- Resource Classes ---
 
 class ProjectListResource(Resource):
@@ -90,14 +172,32 @@ class ProjectListResource(Resource):
         if not user:
             return {'message': 'User not found'}, 401 # Unauthorized
 
-        projects = Project.query.join(ProjectMember).filter(
-            ProjectMember.user_id == current_user_id
-        ).options(
-            selectinload(Project.member_associations).joinedload(ProjectMember.user)
-        ).all()
-
-        return [serialize_project(p, include_members=True) for p in projects], 200 
-        # Return serialized projects without members for the dashboard
+        # 1. The memberships (and the users behind them) live in the catalog
+        project_ids = [pid for (pid,) in db.session.query(ProjectMember.project_id).filter_by(user_id=current_user_id)]
+        if not project_ids:
+            return [], 200
+
+        members_by_project = {}
+        for assoc in ProjectMember.query.options(
+            joinedload(ProjectMember.user)
+        ).filter(ProjectMember.project_id.in_(project_ids)):
+            members_by_project.setdefault(assoc.project_id, []).append(assoc)
+
+        # 2. The projects themselves are fetched from all their shards in parallel
+        def load_projects(session, shard_project_ids):
+            return session.query(Project.id, Project.name, Project.description).filter(
+                Project.id.in_(shard_project_ids)
+            ).all()
+
+        projects = sorted(shard_router.fan_out(load_projects, project_ids))
+
+        return [{
+            'id': project_id,
+            'name': name,
+            'description': description,
+            'members': serialize_members(members_by_project.get(project_id, []))
+        } for project_id, name, description in projects], 200
+        # Return serialized projects with members for the dashboard
 
     @jwt_required()
     def post(self):
@@ -116,8 +216,9 @@ class ProjectListResource(Resource):
         if not data.get('name'):
             return {'message': 'Project name is required'}, 400 # Bad Request
 
-        # 1. Create the project
+        # 1. Create the project (on the least busy shard, when sharding is enabled)
         new_project = Project(
+            id=shard_router.allocate_project(),
             name=data['name'],
             description=data.get('description')
         )
@@ -147,6 +248,11 @@ class ProjectResource(Resource):
         """
         Gets a single project by its ID.
         Returns the project, its members, and all its tasks.
+        Optional query parameters:
+        - fields: comma separated task fields to return, e.g. ?fields=id,title,status
+        - format: 'full' (default) or 'columnar' for the compact board payload
+        - include_members: 'false' to leave the member list out (large projects page it
+          through GET /api/projects/<id>/members instead)
         """
         # Get the user ID from the JWT
         current_user_id = get_jwt_identity()
@@ -163,19 +269,57 @@ class ProjectResource(Resource):
         if not membership:
             return {'message': 'Unauthorized'}, 403 # Forbidden
 
-        # 2. If they are a member, fetch the full project data
-        project = Project.query.options(
-            selectinload(Project.tasks).options(
-                joinedload(Task.creator)
-            ),
+        if not shard_router.bind_project(project_id):
+            return {'message': 'Project not found'}, 404
+
+        try:
+            fields = parse_task_fields(request.args.get('fields'))
+        except ValueError as e:
+            return {'message': str(e)}, 400 # Bad Request
+
+        board_format = request.args.get('format', 'full')
+        if board_format not in ('full', 'columnar'):
+            return {'message': "Invalid format. Must be 'full' or 'columnar'"}, 400
+
+        include_members = request.args.get('include_members', 'true').lower() not in ('0', 'false', 'no')
+
+        # 2. If they are a member, fetch the project (and its members, unless they are paged separately)
+        project_query = Project.query
+        if include_members:
             # Eager load associations AND the user data for each association
-            selectinload(Project.member_associations).joinedload(ProjectMember.user)
-        ).get(project_id)
+            project_query = project_query.options(
+                selectinload(Project.member_associations).joinedload(ProjectMember.user)
+            )
+        project = project_query.get(project_id)
 
         if not project:
             return {'message': 'Project not found'}, 404
 
-        return serialize_project(project, include_tasks=True, include_members=True), 200
+        # 3. Fetch the tasks, loading only the requested columns and sorted by the database
+        columnar = board_format == 'columnar'
+        load_fields = fields
+        if columnar and fields is not None and 'status' not in fields:
+            load_fields = fields + ['status'] # Columnar tasks are grouped by status, so it is always needed
+
+        tasks = Task.query.options(
+            *task_load_options(load_fields, load_creator=not columnar)
+        ).filter_by(
+            project_id=project_id
+        ).order_by(Task.status, Task.order).all()
+
+        if columnar:
+            # Members are already loaded, only creators that are not among them need a query
+            users = {assoc.user.id: assoc.user for assoc in project.member_associations} if include_members else {}
+            if fields is None or 'creator' in fields:
+                missing_ids = {t.creator_id for t in tasks if t.creator_id} - set(users)
+                if missing_ids:
+                    for user in User.query.options(load_only(User.id, User.email)).filter(User.id.in_(missing_ids)):
+                        users[user.id] = user
+            return serialize_board_columnar(project, tasks, users.values(), fields, include_members), 200
+
+        data = serialize_project(project, include_members=include_members)
+        data['tasks'] = [serialize_task(task, fields) for task in tasks]
+        return data, 200
 
     @jwt_required()
     def put(self, project_id):
@@ -199,6 +343,9 @@ class ProjectResource(Resource):
         if membership.role != 'owner':
             return {'message': 'Only the project owner can edit this project'}, 403
 
+        if not shard_router.bind_project(project_id):
+            return {'message': 'Project not found'}, 404
+
         project = Project.query.get(project_id)
         if not project:
             return {'message': 'Project not found'}, 404
@@ -231,20 +378,69 @@ class ProjectResource(Resource):
         if membership.role != 'owner':
             return {'message': 'Only the project owner can delete this project'}, 403
 
+        if not shard_router.bind_project(project_id):
+            return {'message': 'Project not found'}, 404
+
         project = Project.query.get(project_id)
         if not project:
             return {'message': 'Project not found'}, 404
 
+        # The activity log can be huge, delete it in bulk instead of through the ORM,
+        # after dropping the events still waiting in the buffer
+        activity_log.discard_project(project_id)
+        ActivityLog.query.filter_by(project_id=project_id).delete(synchronize_session=False)
         db.session.delete(project)
+        shard_router.forget_project(project_id)
         db.session.commit()
 
         return {'message': 'Project deleted'}, 200
     
 class ProjectMemberListResource(Resource):
     """
-    Handles adding new members to a project.
+    Handles listing and adding members of a project.
+    - GET /api/projects/<int:project_id>/members?per_page=100&after_id=<user_id>
     - POST /api/projects/<int:project_id>/members
     """
+    @jwt_required()
+    def get(self, project_id):
+        """
+        Gets one page of the project's members, ordered by user id.
+        Pass the returned next_after_id as ?after_id= to get the following page.
+        """
+        current_user_id = get_jwt_identity()
+
+        # --- SECURITY CHECK ---
+        membership = ProjectMember.query.filter_by(
+            user_id=current_user_id,
+            project_id=project_id
+        ).first()
+
+        if not membership:
+            return {'message': 'Unauthorized'}, 403 # Forbidden
+
+        try:
+            per_page = min(int(request.args.get('per_page', DEFAULT_MEMBER_PAGE_SIZE)), MAX_MEMBER_PAGE_SIZE)
+            after_id = int(request.args.get('after_id', 0))
+        except ValueError:
+            return {'message': 'per_page and after_id must be integers'}, 400 # Bad Request
+        if per_page < 1:
+            return {'message': 'per_page must be positive'}, 400 # Bad Request
+
+        # Keyset pagination over ix_project_members_project_user
+        associations = ProjectMember.query.options(
+            joinedload(ProjectMember.user)
+        ).filter(
+            ProjectMember.project_id == project_id,
+            ProjectMember.user_id > after_id
+        ).order_by(ProjectMember.user_id).limit(per_page + 1).all()
+
+        page = associations[:per_page]
+        has_next = len(associations) > per_page
+        return {
+            'items': serialize_members(page),
+            'next_after_id': page[-1].user_id if has_next else None
+        }, 200
+
     @jwt_required()
     def post(self, project_id):
         """Adds a new user to the project as a 'member'."""
@@ -293,6 +489,101 @@ class ProjectMemberListResource(Resource):
         
         return member_data, 201 # Created
     
+class ProjectMemberBulkResource(Resource):
+    """
+    Handles inviting many users to a project at once.
+    - POST /api/projects/<int:project_id>/members/bulk
+    """
+    @jwt_required()
+    def post(self, project_id):
+        """
+        Adds every user in a list of emails to the project.
+        Expects JSON: { "emails": ["...", ...], "role": "member" (optional) }
+        Returns the outcome for each email: 'added', 'already_member', 'not_found', 'duplicate' or 'invalid'.
+        """
+        current_user_id = get_jwt_identity()
+
+        # 1. Security Check: Only owners can add new members.
+        auth_membership = ProjectMember.query.filter_by(
+            user_id=current_user_id,
+            project_id=project_id
+        ).first()
+
+        if not auth_membership or auth_membership.role != 'owner':
+            return {'message': 'Only the project owner can add members'}, 403
+
+        data = request.get_json()
+        emails = data.get('emails')
+        if not isinstance(emails, list) or not emails:
+            return {'message': 'emails must be a non-empty list'}, 400 # Bad Request
+        if len(emails) > MAX_BULK_INVITES:
+            return {'message': f'At most {MAX_BULK_INVITES} emails per request'}, 400 # Bad Request
+
+        role = data.get('role', 'member')
+        if role not in ['owner', 'member']:
+            return {'message': "Invalid role. Must be 'owner' or 'member'"}, 400
+
+        # Keep the request order, without duplicates
+        wanted = list(dict.fromkeys(e.strip() for e in emails if isinstance(e, str) and e.strip()))
+
+        # 2. Find all the users with one IN query
+        users = {
+            email: user_id for user_id, email in
+            db.session.query(User.id, User.email).filter(User.email.in_(wanted))
+        } if wanted else {}
+
+        # 3. Find the existing memberships with one query
+        def existing_members():
+            return {
+                user_id for (user_id,) in db.session.query(ProjectMember.user_id).filter(
+                    ProjectMember.project_id == project_id,
+                    ProjectMember.user_id.in_(list(users.values()))
+                )
+            } if users else set()
+
+        existing = existing_members()
+
+        # 4. Insert all the new memberships with one bulk statement. A concurrent invite of
+        # the same user makes it fail on the primary key: re-check and retry without them
+        for attempt in range(BULK_INVITE_ATTEMPTS):
+            new_rows = [
+                {'user_id': user_id, 'project_id': project_id, 'role': role}
+                for email, user_id in users.items() if user_id not in existing
+            ]
+            if not new_rows:
+                break
+            try:
+                db.session.execute(ProjectMember.__table__.insert(), new_rows)
+                db.session.commit()
+                break
+            except IntegrityError:
+                db.session.rollback()
+                existing = existing_members()
+        else:
+            return {'message': 'The members changed while inviting, please retry'}, 409 # Conflict
+
+        # 5. Report the outcome of every email, in the order they were sent
+        results = []
+        seen = set()
+        for email in emails:
+            if not isinstance(email, str) or not email.strip():
+                results.append({'email': email, 'status': 'invalid'})
+                continue
+            if email.strip() in seen:
+                results.append({'email': email, 'status': 'duplicate'})
+                continue
+            seen.add(email.strip())
+
+            user_id = users.get(email.strip())
+            if user_id is None:
+                results.append({'email': email, 'status': 'not_found'})
+            elif user_id in existing:
+                results.append({'email': email, 'status': 'already_member', 'user_id': user_id})
+            else:
+                results.append({'email': email, 'status': 'added', 'user_id': user_id, 'role': role})
+
+        return {'added': len(new_rows), 'results': results}, 200
+
 class ProjectMemberResource(Resource):
     """
     Handles updating a role or removing a member.
@@ -376,4 +667,5 @@ class ProjectMemberResource(Resource):
 api.add_resource(ProjectListResource, '/projects')
 api.add_resource(ProjectResource, '/projects/<int:project_id>')
 api.add_resource(ProjectMemberListResource, '/projects/<int:project_id>/members')
+api.add_resource(ProjectMemberBulkResource, '/projects/<int:project_id>/members/bulk')
 api.add_resource(ProjectMemberResource, '/projects/<int:project_id>/members/<int:user_id>')
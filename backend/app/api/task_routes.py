@@ -1,19 +1,26 @@
 """
 This file defines the RESTful API routes for Tasks.
 - /api/projects/<id>/tasks (POST)
-- /api/tasks/<id> (PUT, DELETE)
+- /api/tasks/<id> (GET, PUT, DELETE)
 - /api/tasks/<id>/move (PATCH)
+- /api/me/due (GET)
+
+Every route that returns a task accepts ?fields=id,title,... to only return those fields.
 """
 
-from flask import request
+from flask import request, current_app
 from flask_restful import Resource
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from datetime import datetime
+from sqlalchemy.orm import joinedload
+from sqlalchemy.orm.exc import StaleDataError
+from datetime import datetime, timedelta
 import json
 
 from . import api
-from ..models import db, Project, Task, User
-from .project_routes import serialize_task
+from ..models import db, Task, ProjectMember
+from ..sharding import shard_router
+from ..activity import activity_log
+from .project_routes import serialize_task, parse_task_fields, task_load_options
 
 # --- Helper function to parse dates ---
 def parse_iso_date(date_string):
@@ -28,6 +35,81 @@ def parse_iso_date(date_string):
     except ValueError:
         return None
 
+# --- Helper functions for loading and versioning ---
+def load_task_for_member(task_id, user_id, options=None):
+    """
+    Loads a task and checks the user's membership of its project in a single query
+    (after a catalog lookup of the task's shard when sharding is enabled).
+    Returns (task, is_member); task is None if it does not exist.
+    """
+    if not shard_router.bind_task(task_id):
+        return None, False
+
+    row = db.session.query(Task, ProjectMember.user_id).options(
+        *(options if options is not None else [joinedload(Task.creator)])
+    ).outerjoin(
+        ProjectMember,
+        db.and_(ProjectMember.project_id == Task.project_id, ProjectMember.user_id == user_id)
+    ).filter(Task.id == task_id).first()
+
+    if row is None:
+        return None, False
+    return row[0], row[1] is not None
+
+def expected_version(data):
+    """
+    Returns the task version the client based its change on, taken from the
+    If-Match header or the "version" field, or None if the client sent neither.
+    Raises ValueError if the value is not a version number.
+    """
+    if_match = request.headers.get('If-Match')
+    if if_match and if_match.strip() != '*':
+        return int(if_match.strip().removeprefix('W/').strip('"'))
+    version = data.get('version')
+    if version is None:
+        return None
+    if not isinstance(version, int) or isinstance(version, bool):
+        raise ValueError('version must be an integer')
+    return version
+
+def task_etag(task):
+    """
+    Returns the headers announcing the task's current version. The ETag is weak: the same
+    version is sent as full JSON, ?fields= subsets and gzip/br bodies, which are not byte-identical.
+    """
+    return {'ETag': f'W/"{task.version}"'}
+
+def version_conflict(task_id, fields=None):
+    """Builds the 409 response, including the task as it currently is in the database."""
+    db.session.rollback()
+    task = Task.query.options(joinedload(Task.creator)).get(task_id)
+    if not task:
+        return {'message': 'Task not found'}, 404 # Deleted by someone else meanwhile
+    return {
+        'message': 'Task was modified by someone else',
+        'task': serialize_task(task, fields)
+    }, 409, task_etag(task) # Conflict
+
+def commit_task_update(task, fields, user_id, action, details=None):
+    """
+    Flushes the UPDATE (guarded by the version column) and serializes the task
+    from the session before committing, so no re-fetch is needed afterwards.
+    The change is then queued in the project's activity log.
+    """
+    # Read before the flush: after a failed flush the session refuses every access until rolled back
+    project_id, task_id = task.project_id, task.id
+    try:
+        db.session.flush()
+    except StaleDataError:
+        # Another request changed the row between our SELECT and UPDATE
+        return version_conflict(task_id, fields)
+
+    response = serialize_task(task, fields), 200, task_etag(task)
+    db.session.commit()
+
+    activity_log.record(project_id, action, user_id=user_id, task_id=task_id, details=details)
+    return response
+
 class TaskListResource(Resource):
     """
     Handles creation of tasks for a specific project.
@@ -40,18 +122,27 @@ class TaskListResource(Resource):
         """
         # --- Get the current user ---
         current_user_id = get_jwt_identity()
-        user = User.query.get(current_user_id)
-        if not user:
-            return {'message': 'User not found'}, 401 # Unauthorized
-        
-        project = Project.query.get(project_id)
-        if not project:
-            return {'message': 'Project not found'}, 404 # Not Found
-        
+
         # --- SECURITY CHECK ---
-        if user not in project.members:
+        # One query for the membership and the user, who becomes the task's creator
+        membership = ProjectMember.query.options(
+            joinedload(ProjectMember.user)
+        ).filter_by(
+            user_id=current_user_id,
+            project_id=project_id
+        ).first()
+
+        if not membership:
             return {'message': 'Unauthorized'}, 403 # Forbidden
 
+        if not shard_router.bind_project(project_id):
+            return {'message': 'Project not found'}, 404 # Not Found
+
+        try:
+            fields = parse_task_fields(request.args.get('fields'))
+        except ValueError as e:
+            return {'message': str(e)}, 400 # Bad Request
+
         data = request.get_json()
         if not data.get('title'):
             return {'message': 'Task title is required'}, 400 # Bad Request
@@ -66,12 +157,13 @@ class TaskListResource(Resource):
         new_order = (max_order or 0) + 1
 
         new_task = Task(
+            id=shard_router.allocate_task_id(project_id), # Globally unique id when sharding is enabled
             title=data['title'],
             description=data.get('description'),
             status=status,
             order=new_order,
             project_id=project_id,
-            creator_id=current_user_id,
+            creator=membership.user,
             expiry_date=parse_iso_date(data.get('expiry_date'))
         )
         
@@ -79,19 +171,48 @@ class TaskListResource(Resource):
             new_task.assignees = data['assignees'] # Use the setter property
 
         db.session.add(new_task) # Add the new task to the session
-        db.session.commit()
+        db.session.flush() # INSERT now, this assigns the id and the first version
 
-        db.session.refresh(new_task)
+        # Everything is already in the session, so serialize before the commit expires it
+        response = serialize_task(new_task, fields), 201, task_etag(new_task) # Created
+        task_id = new_task.id
+        db.session.commit()
 
-        new_task = Task.query.get(new_task.id) # Re-fetch to get updated fields
-        return serialize_task(new_task), 201 # Created
+        activity_log.record(project_id, 'task.created', user_id=current_user_id, task_id=task_id,
+                            details={'title': data['title'], 'status': status})
+        return response
 
 class TaskResource(Resource):
     """
     Handles routes for a single task instance.
+    - GET /api/tasks/<int:task_id>
     - PUT /api/tasks/<int:task_id>
     - DELETE /api/tasks/<int:task_id>
     """
+    @jwt_required()
+    def get(self, task_id):
+        """
+        Gets a single task, loading only the columns needed for ?fields=.
+        """
+        current_user_id = get_jwt_identity()
+
+        try:
+            fields = parse_task_fields(request.args.get('fields'))
+        except ValueError as e:
+            return {'message': str(e)}, 400 # Bad Request
+
+        # version is always loaded, it is sent as the ETag
+        load_fields = fields + ['version'] if fields is not None else None
+        task, is_member = load_task_for_member(task_id, current_user_id, task_load_options(load_fields))
+        if not task:
+            return {'message': 'Task not found'}, 404 # Not Found
+
+        # --- SECURITY CHECK ---
+        if not is_member:
+            return {'message': 'Unauthorized'}, 403 # Forbidden
+
+        return serialize_task(task, fields), 200, task_etag(task)
+
     @jwt_required()
     def put(self, task_id):
         """
@@ -99,20 +220,31 @@ class TaskResource(Resource):
         """
         # --- Get the current user ---
         current_user_id = get_jwt_identity()
-        user = User.query.get(current_user_id)
-        if not user:
-            return {'message': 'User not found'}, 401 # Unauthorized
 
-        task = Task.query.get(task_id)
+        task, is_member = load_task_for_member(task_id, current_user_id)
         if not task:
             return {'message': 'Task not found'}, 404 # Not Found
 
         # --- SECURITY CHECK ---
         # We check membership via the task's parent project
-        if user not in task.project.members:
+        if not is_member:
             return {'message': 'Unauthorized'}, 403 # Forbidden
 
+        try:
+            fields = parse_task_fields(request.args.get('fields'))
+        except ValueError as e:
+            return {'message': str(e)}, 400 # Bad Request
+
         data = request.get_json()
+
+        # --- VERSION CHECK ---
+        try:
+            version = expected_version(data)
+        except ValueError:
+            return {'message': 'Invalid version'}, 400 # Bad Request
+        if version is not None and version != task.version:
+            return version_conflict(task_id, fields)
+
         task.title = data.get('title', task.title)
         task.description = data.get('description', task.description)
 
@@ -129,10 +261,8 @@ class TaskResource(Resource):
             else:
                 return {'message': 'assignees must be a list'}, 400 # Bad Request
 
-        db.session.commit()
-
-        task = Task.query.get(task_id)
-        return serialize_task(task), 200
+        changed = [key for key in ('title', 'description', 'expiry_date', 'assignees') if key in data]
+        return commit_task_update(task, fields, current_user_id, 'task.updated', {'fields': changed})
 
     @jwt_required()
     def delete(self, task_id):
@@ -141,20 +271,22 @@ class TaskResource(Resource):
         """
         # --- Get the current user ---
         current_user_id = get_jwt_identity()
-        user = User.query.get(current_user_id)
-        if not user:
-            return {'message': 'User not found'}, 401 # Unauthorized
 
-        task = Task.query.get(task_id)
+        task, is_member = load_task_for_member(task_id, current_user_id, options=[])
         if not task:
             return {'message': 'Task not found'}, 404 # Not Found
 
         # --- SECURITY CHECK ---
-        if user not in task.project.members:
+        if not is_member:
             return {'message': 'Unauthorized'}, 403 # Forbidden
 
+        project_id, title = task.project_id, task.title
         db.session.delete(task)
+        shard_router.forget_task(task_id)
         db.session.commit()
+
+        activity_log.record(project_id, 'task.deleted', user_id=current_user_id, task_id=task_id,
+                            details={'title': title})
         
         return {'message': 'Task deleted'}, 200
 
@@ -167,36 +299,98 @@ class TaskMoveResource(Resource):
     def patch(self, task_id):
         """
         Updates a task's status and/or order.
-        Expects JSON: { "status": "...", "order": ... }
+        Expects JSON: { "status": "...", "order": ..., "version": ... (optional) }
         """
         # --- Get the current user ---
         current_user_id = get_jwt_identity()
-        user = User.query.get(current_user_id)
-        if not user:
-            return {'message': 'User not found'}, 401
 
-        task = Task.query.get(task_id)
+        task, is_member = load_task_for_member(task_id, current_user_id)
         if not task:
             return {'message': 'Task not found'}, 404 # Not Found
         
         # --- SECURITY CHECK ---
-        if user not in task.project.members:
+        if not is_member:
             return {'message': 'Unauthorized'}, 403 # Forbidden
 
+        try:
+            fields = parse_task_fields(request.args.get('fields'))
+        except ValueError as e:
+            return {'message': str(e)}, 400 # Bad Request
+
         data = request.get_json()
+
+        # --- VERSION CHECK ---
+        try:
+            version = expected_version(data)
+        except ValueError:
+            return {'message': 'Invalid version'}, 400 # Bad Request
+        if version is not None and version != task.version:
+            return version_conflict(task_id, fields)
         
+        from_status = task.status
+
         if 'status' in data:
             task.status = data['status']
             
         if 'order' in data:
             task.order = data['order']
             
-        db.session.commit()
+        return commit_task_update(task, fields, current_user_id, 'task.moved', {
+            'from_status': from_status,
+            'to_status': task.status,
+            'order': task.order
+        })
+
+class DueTaskListResource(Resource):
+    """
+    Handles the current user's upcoming deadlines across all their projects.
+    - GET /api/me/due?before=<ISO date>&limit=100
+    """
+    @jwt_required()
+    def get(self):
+        """
+        Gets the open tasks (not DONE) of the user's projects that are due before the given date,
+        soonest first. Defaults to the due-soon window (now + DUE_SOON_HOURS).
+        """
+        current_user_id = get_jwt_identity()
+
+        if 'before' in request.args:
+            before = parse_iso_date(request.args['before'])
+            if not before:
+                return {'message': 'before must be an ISO date'}, 400 # Bad Request
+        else:
+            before = datetime.utcnow() + timedelta(hours=current_app.config['DUE_SOON_HOURS'])
+
+        try:
+            limit = int(request.args.get('limit', 100))
+        except ValueError:
+            limit = 0
+        if limit < 1:
+            return {'message': 'limit must be a positive integer'}, 400 # Bad Request
+        limit = min(limit, 500)
+
+        project_ids = [pid for (pid,) in db.session.query(ProjectMember.project_id).filter_by(user_id=current_user_id)]
+        if not project_ids:
+            return [], 200
+
+        # Walks ix_task_expiry_status in due order and keeps the tasks of the user's projects,
+        # on every shard holding one of them in parallel
+        def load_due_tasks(session, shard_project_ids):
+            tasks = session.query(Task).options(
+                joinedload(Task.creator)
+            ).filter(
+                Task.expiry_date <= before,
+                Task.status != 'DONE',
+                Task.project_id.in_(shard_project_ids)
+            ).order_by(Task.expiry_date, Task.id).limit(limit).all()
+            return [(task.expiry_date, task.id, serialize_task(task)) for task in tasks]
+
+        due_tasks = sorted(shard_router.fan_out(load_due_tasks, project_ids))[:limit]
 
-        task = Task.query.get(task_id)
-        return serialize_task(task), 200
+        return [data for _, _, data in due_tasks], 200
 
 # --- Register the resources with our API ---
 api.add_resource(TaskListResource, '/projects/<int:project_id>/tasks')
 api.add_resource(TaskResource, '/tasks/<int:task_id>')
 api.add_resource(TaskMoveResource, '/tasks/<int:task_id>/move')
+api.add_resource(DueTaskListResource, '/me/due')
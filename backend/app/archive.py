@@ -0,0 +1,97 @@
+"""
+This file contains the archive subsystem.
+
+Tasks that have been DONE for longer than their project's ArchivePolicy allows
+are moved, in batches, from the hot 'task' table into the 'archived_task' table.
+Archived tasks can be browsed and restored through the archive API routes.
+"""
+
+from datetime import datetime, timedelta
+
+from flask import current_app
+
+from .models import db, Task, ArchivedTask, ArchivePolicy
+from .sharding import shard_router
+
+# archived_task column -> expression on the hot task row it is copied from
+ARCHIVED_COLUMNS = {
+    'task_id': Task.id,
+    'title': Task.title,
+    'description': Task.description,
+    'status': Task.status,
+    'order': Task.order,
+    'expiry_date': Task.expiry_date,
+    'completed_at': Task.completed_at,
+    'assignees_text': Task.assignees_text,
+    'creator_id': Task.creator_id,
+    'project_id': Task.project_id,
+}
+
+def archive_project_tasks(project_id, done_after_days, now=None, batch_size=None):
+    """
+    Moves the completed tasks of one project that match its policy into the archive.
+    Each batch is copied and deleted in its own transaction, so a large backlog
+    never holds a long write lock. Returns the number of archived tasks.
+    """
+    now = now or datetime.utcnow()
+    batch_size = batch_size or current_app.config['ARCHIVE_BATCH_SIZE']
+    cutoff = now - timedelta(days=done_after_days)
+    archived = 0
+
+    def archivable(task_ids=None):
+        # Every step repeats the policy, so a task moved out of DONE meanwhile is neither copied nor deleted
+        conditions = [Task.project_id == project_id, Task.status == 'DONE', Task.completed_at <= cutoff]
+        if task_ids is not None:
+            conditions.append(Task.id.in_(task_ids))
+        return conditions
+
+    while True:
+        # Served by ix_task_project_status_completed. FOR UPDATE keeps the rows still on
+        # databases with row locks (SQLite ignores it, its single writer serializes the batch instead)
+        task_ids = [task_id for (task_id,) in db.session.query(Task.id).filter(
+            *archivable()
+        ).order_by(Task.id).limit(batch_size).with_for_update()]
+
+        if not task_ids:
+            break
+
+        # 1. Copy the batch into the cold table with a single INSERT ... SELECT
+        source = db.select(*ARCHIVED_COLUMNS.values(), db.literal(now)).where(*archivable(task_ids))
+        inserted = db.session.execute(
+            ArchivedTask.__table__.insert().from_select([*ARCHIVED_COLUMNS, 'archived_at'], source)
+        ).rowcount
+
+        # 2. Remove the same rows from the hot table, with the same predicate
+        deleted = Task.query.filter(*archivable(task_ids)).delete(synchronize_session=False)
+        if inserted != deleted:
+            # Only possible if a task changed between the two statements, retry the batch
+            db.session.rollback()
+            continue
+
+        # 3. Drop the archived tasks from the directory, in the same commit. A task that left
+        # DONE meanwhile is still in the hot table and keeps its entry
+        live_ids = {task_id for (task_id,) in db.session.query(Task.id).filter(Task.id.in_(task_ids))}
+        shard_router.forget_tasks([task_id for task_id in task_ids if task_id not in live_ids])
+        db.session.commit()
+        db.session.expunge_all() # The deleted tasks must not linger in the identity map
+
+        archived += deleted
+        if len(task_ids) < batch_size:
+            break
+
+    return archived
+
+def archive_completed_tasks():
+    """Scheduled job: applies every enabled archive policy. Returns the number of archived tasks."""
+    now = datetime.utcnow()
+    total = 0
+
+    for shard_key in shard_router.each_shard():
+        # Only the plain values are kept, archive_project_tasks() clears the session between batches
+        policies = db.session.query(ArchivePolicy.project_id, ArchivePolicy.done_after_days).filter(
+            ArchivePolicy.enabled.is_(True)
+        ).all()
+
+        for project_id, done_after_days in policies:
+            total += archive_project_tasks(project_id, done_after_days, now=now)
+    return total
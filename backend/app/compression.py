@@ -0,0 +1,119 @@
+"""
+This file contains the response compression middleware.
+
+JSON responses above a minimum size are compressed with brotli or gzip,
+depending on what the client advertises in its Accept-Encoding header.
+Brotli is optional: if the 'brotli' package is not installed only gzip is offered.
+
+Compressed bodies can be kept in a small in-memory LRU cache keyed by a hash of the
+uncompressed payload, so a hot board that has not changed is not recompressed on
+every request (hashing is far cheaper than compressing).
+"""
+
+import gzip
+import hashlib
+import threading
+from collections import OrderedDict
+
+from flask import request
+
+try:
+    import brotli
+except ImportError: # Optional dependency
+    brotli = None
+
+def compress_body(body, encoding, level):
+    """Compresses a bytes body with the given encoding ('br' or 'gzip')."""
+    if encoding == 'br':
+        return brotli.compress(body, quality=level)
+    # mtime=0 keeps the output deterministic, so identical payloads give identical bytes
+    return gzip.compress(body, compresslevel=level, mtime=0)
+
+class CompressedPayloadCache:
+    """Thread-safe LRU cache of compressed bodies, keyed by payload hash and encoding."""
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_or_compress(self, body, encoding, level):
+        """Returns the compressed body, compressing (and caching) it on a miss."""
+        key = (hashlib.blake2b(body, digest_size=16).digest(), encoding, level)
+        with self._lock:
+            compressed = self._entries.get(key)
+            if compressed is not None:
+                self._entries.move_to_end(key)
+                return compressed
+
+        # Compress outside the lock so other requests are not serialized behind it
+        compressed = compress_body(body, encoding, level)
+
+        with self._lock:
+            self._entries[key] = compressed
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False) # Drop the least recently used entry
+        return compressed
+
+class Compressor:
+    """Flask extension that compresses responses in an after_request hook."""
+
+    def __init__(self, app=None):
+        self.cache = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('COMPRESS_ENABLED', True)
+        app.config.setdefault('COMPRESS_MIN_SIZE', 1024) # Bytes, smaller bodies are sent as-is
+        app.config.setdefault('COMPRESS_LEVEL', 6) # gzip level (1-9)
+        app.config.setdefault('COMPRESS_BR_LEVEL', 4) # brotli quality (0-11)
+        app.config.setdefault('COMPRESS_MIMETYPES', ['application/json', 'text/html', 'text/plain'])
+        app.config.setdefault('COMPRESS_CACHE_SIZE', 128) # Number of cached bodies, 0 disables the cache
+
+        self.app = app
+        app.extensions['compressor'] = self
+
+        if app.config['COMPRESS_CACHE_SIZE'] > 0:
+            self.cache = CompressedPayloadCache(app.config['COMPRESS_CACHE_SIZE'])
+
+        if app.config['COMPRESS_ENABLED']:
+            app.after_request(self.compress_response)
+
+    def choose_encoding(self):
+        """Picks the best encoding the client accepts, or None."""
+        offered = ['br', 'gzip'] if brotli is not None else ['gzip']
+        return request.accept_encodings.best_match(offered)
+
+    def compress_response(self, response):
+        """after_request hook: compresses the response body when it is worth it."""
+        config = self.app.config
+
+        if (response.direct_passthrough
+                or response.status_code < 200
+                or response.status_code in (204, 304)
+                or 'Content-Encoding' in response.headers
+                or response.mimetype not in config['COMPRESS_MIMETYPES']):
+            return response
+
+        body = response.get_data()
+        if len(body) < config['COMPRESS_MIN_SIZE']:
+            return response
+
+        # From here on the representation depends on Accept-Encoding
+        response.vary.add('Accept-Encoding')
+
+        encoding = self.choose_encoding()
+        if not encoding:
+            return response
+
+        level = config['COMPRESS_BR_LEVEL'] if encoding == 'br' else config['COMPRESS_LEVEL']
+        if self.cache is not None:
+            compressed = self.cache.get_or_compress(body, encoding, level)
+        else:
+            compressed = compress_body(body, encoding, level)
+
+        response.set_data(compressed) # Also updates Content-Length
+        response.headers['Content-Encoding'] = encoding
+        return response
@@ -0,0 +1,148 @@
+"""
+This file contains the due-date scanner.
+
+A scheduled job looks for tasks that became overdue, or due soon, since its previous
+run and records a DueNotification for each of them. Every kind of event keeps its own
+watermark in SchedulerState, so a run only scans the new slice of time
+(watermark, now] (or (watermark, now + DUE_SOON_HOURS] for 'due_soon'),
+walking the (expiry_date, status) index in batches.
+
+That scan cannot see a deadline set inside time it already passed (a new task due an
+hour ago, a deadline moved earlier, a task reopened after its deadline). Task.expiry_set_at
+records when the deadline was set or the task reopened, so every run also picks up,
+with a second watermark per kind, the tasks changed since the previous run whose
+deadline falls behind the first watermark.
+"""
+
+from datetime import datetime, timedelta
+
+from flask import current_app
+
+from .models import db, Task, DueNotification, SchedulerState
+from .sharding import shard_router
+
+def get_watermark(name, default):
+    """Returns the stored watermark of a job, or default if it never ran."""
+    state = SchedulerState.query.get(name)
+    if state is None or state.watermark is None:
+        return default
+    return state.watermark
+
+def set_watermark(name, value):
+    """Stores the watermark of a job (the caller commits)."""
+    state = SchedulerState.query.get(name)
+    if state is None:
+        state = SchedulerState(name=name)
+        db.session.add(state)
+    state.watermark = value
+
+def record_notifications(kind, rows, now):
+    """Inserts one DueNotification per (task_id, project_id, due_at) row and commits."""
+    db.session.execute(DueNotification.__table__.insert(), [
+        {'kind': kind, 'task_id': task_id, 'project_id': project_id, 'due_at': due_at, 'created_at': now}
+        for task_id, project_id, due_at in rows
+    ])
+    db.session.commit()
+
+def scan_due_window(kind, start, end, now, batch_size):
+    """
+    Records a DueNotification of the given kind for every open task with
+    start < expiry_date <= end. Returns the number of notifications created.
+    """
+    created = 0
+    last_due, last_id = start, 0
+
+    while True:
+        # Keyset pagination over (expiry_date, id), served by ix_task_expiry_status
+        rows = db.session.query(Task.id, Task.project_id, Task.expiry_date).filter(
+            Task.expiry_date > start,
+            Task.expiry_date <= end,
+            Task.status != 'DONE',
+            db.or_(
+                Task.expiry_date > last_due,
+                db.and_(Task.expiry_date == last_due, Task.id > last_id)
+            )
+        ).order_by(Task.expiry_date, Task.id).limit(batch_size).all()
+
+        if not rows:
+            break
+
+        record_notifications(kind, rows, now)
+        created += len(rows)
+        last_id, _, last_due = rows[-1]
+        if len(rows) < batch_size:
+            break
+
+    return created
+
+def scan_changed_deadlines(kind, since, until, scanned_before, due_after, now, batch_size):
+    """
+    Records a DueNotification of the given kind for every open task whose deadline was
+    set (or which was reopened) with since < expiry_set_at <= until, and whose deadline is
+    in the part of time the window scan already passed: due_after < expiry_date <= scanned_before
+    (due_after=None for no lower bound). Returns the number of notifications created.
+    """
+    created = 0
+    last_set, last_id = since, 0
+    conditions = [
+        Task.expiry_set_at > since,
+        Task.expiry_set_at <= until,
+        Task.expiry_date <= scanned_before,
+        Task.status != 'DONE',
+    ]
+    if due_after is not None:
+        conditions.append(Task.expiry_date > due_after)
+
+    while True:
+        # Keyset pagination over (expiry_set_at, id), served by ix_task_expiry_set_at
+        rows = db.session.query(Task.id, Task.project_id, Task.expiry_date, Task.expiry_set_at).filter(
+            *conditions,
+            db.or_(
+                Task.expiry_set_at > last_set,
+                db.and_(Task.expiry_set_at == last_set, Task.id > last_id)
+            )
+        ).order_by(Task.expiry_set_at, Task.id).limit(batch_size).all()
+
+        if not rows:
+            break
+
+        record_notifications(kind, [(task_id, project_id, due_at) for task_id, project_id, due_at, _ in rows], now)
+        created += len(rows)
+        last_id, _, _, last_set = rows[-1]
+        if len(rows) < batch_size:
+            break
+
+    return created
+
+def scan_due_tasks():
+    """Scheduled job: records newly overdue and due-soon tasks. Returns the number of notifications."""
+    config = current_app.config
+    now = datetime.utcnow()
+    lookback = now - timedelta(hours=config['DUE_SCAN_LOOKBACK_HOURS']) # Where the very first run starts
+    windows = {
+        'overdue': now,
+        'due_soon': now + timedelta(hours=config['DUE_SOON_HOURS']),
+    }
+
+    # Deadlines changed behind the window: overdue ones are overdue whenever they were due,
+    # due_soon is only worth sending while the deadline is still ahead
+    changed_due_after = {'overdue': None, 'due_soon': now}
+
+    total = 0
+    for kind, end in windows.items():
+        name, changed_name = f'due-scan:{kind}', f'due-scan:{kind}:changed'
+        start = get_watermark(name, lookback)
+        changed_since = get_watermark(changed_name, now) # The first run's window scan covers everything
+        for shard_key in shard_router.each_shard():
+            if start < end:
+                total += scan_due_window(kind, start, end, now, config['DUE_SCAN_BATCH_SIZE'])
+            if changed_since < now:
+                total += scan_changed_deadlines(kind, changed_since, now, start, changed_due_after[kind],
+                                                now, config['DUE_SCAN_BATCH_SIZE'])
+
+        # Only move the watermarks once both scans have been recorded
+        set_watermark(name, max(start, end))
+        set_watermark(changed_name, now)
+        db.session.commit()
+
+    return total
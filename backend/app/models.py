@@ -1,15 +1,22 @@
 """
 This file defines the database models for the TaskFlow application using Flask-SQLAlchemy.
 It includes models for User, Role, Project, and Task, along with the necessary
-many-to-many association tables.
+many-to-many association tables, and the cold storage used for archived tasks.
+
+Models decorated with @sharded live in the shard databases when sharding is
+configured; all others live in the global catalog (see sharding.py).
 """
 
 import json
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy.orm import validates
 from datetime import datetime
 
+from .sharding import ShardedSession, sharded
+
 # Initialize the SQLAlchemy extension.
-db = SQLAlchemy()
+# The session class routes statements on sharded tables to the selected shard.
+db = SQLAlchemy(session_options={'class_': ShardedSession})
 
 # --- Model Definitions ---
 
@@ -19,13 +26,20 @@ class ProjectMember(db.Model):
     and stores their role for that specific project.
     """
     __tablename__ = 'project_members'
+    __table_args__ = (
+        # The primary key starts with user_id, this one serves "members of a project" lookups and paging
+        db.Index('ix_project_members_project_user', 'project_id', 'user_id'),
+    )
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
-    project_id = db.Column(db.Integer, db.ForeignKey('project.id'), primary_key=True)
+    # No FK: memberships stay in the catalog while the project may live in a shard database
+    project_id = db.Column(db.Integer, primary_key=True)
     
     role = db.Column(db.String(50), nullable=False, default='member') # e.g., 'owner', 'member'
 
     user = db.relationship('User', back_populates='project_associations')
-    project = db.relationship('Project', back_populates='member_associations')
+    project = db.relationship(
+        'Project', primaryjoin='foreign(ProjectMember.project_id) == Project.id', back_populates='member_associations'
+    )
 
 class User(db.Model):
     """
@@ -36,6 +50,7 @@ class User(db.Model):
     password = db.Column(db.String(255), nullable=False) # Hashed password
     
     active = db.Column(db.Boolean(), default=True)  # Is the user active?
+    is_admin = db.Column(db.Boolean(), nullable=False, default=False, server_default=db.false()) # Can use the /api/admin routes
 
     project_associations = db.relationship('ProjectMember', back_populates='user', cascade="all, delete-orphan")
    
@@ -43,6 +58,7 @@ class User(db.Model):
     created_tasks = db.relationship('Task', backref='creator', lazy=True, foreign_keys='Task.creator_id')
     # Reverse relationship defined in Task model for tasks assigned to the user
 
+@sharded
 class Project(db.Model):
     """
     Represents a project, which is a container for tasks.
@@ -51,7 +67,10 @@ class Project(db.Model):
     name = db.Column(db.String(100), nullable=False)
     description = db.Column(db.String(255))
 
-    member_associations = db.relationship('ProjectMember', back_populates='project', cascade="all, delete-orphan")
+    member_associations = db.relationship(
+        'ProjectMember', primaryjoin='Project.id == foreign(ProjectMember.project_id)',
+        back_populates='project', cascade="all, delete-orphan"
+    )
 
     # Relationship to Tasks (One-to-Many)
     # If a project is deleted, all of its tasks will be deleted as well.
@@ -59,14 +78,31 @@ class Project(db.Model):
     # deleted-orphan ensures tasks are deleted when no longer associated with a project
     # lazy=True means tasks are loaded only when accessed
 
+    # Archived (cold) tasks and the policy deciding when tasks get moved there
+    archived_tasks = db.relationship('ArchivedTask', backref='project', lazy=True, cascade="all, delete-orphan")
+    archive_policy = db.relationship('ArchivePolicy', backref='project', uselist=False, cascade="all, delete-orphan")
+
+    # Notifications produced by the due-date scanner
+    due_notifications = db.relationship('DueNotification', backref='project', lazy=True, cascade="all, delete-orphan")
+
     @property
     def members(self):
         return [assoc.user for assoc in self.member_associations]
 
+@sharded
 class Task(db.Model):
     """
     Represents a single task within a project.
     """
+    __table_args__ = (
+        # Used by the archive job to find old completed tasks of a project
+        db.Index('ix_task_project_status_completed', 'project_id', 'status', 'completed_at'),
+        # Used by the due-date scanner and GET /api/me/due
+        db.Index('ix_task_expiry_status', 'expiry_date', 'status'),
+        # Used by the due-date scanner to find deadlines changed since its previous run
+        db.Index('ix_task_expiry_set_at', 'expiry_set_at'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(200), nullable=False)
     description = db.Column(db.Text, nullable=True)
@@ -77,6 +113,13 @@ class Task(db.Model):
 
     expiry_date = db.Column(db.DateTime, nullable=True)
 
+    # When expiry_date was last changed or the task reopened, maintained by the validators below,
+    # so the due-date scanner also notices deadlines set in the past (see due.py)
+    expiry_set_at = db.Column(db.DateTime, nullable=True)
+
+    # When the task was last moved into DONE, maintained by the status validator below
+    completed_at = db.Column(db.DateTime, nullable=True)
+
     # This will store a JSON array of strings, e.g., '["Alice", "Bob"]'
     assignees_text = db.Column(db.Text, nullable=True)
 
@@ -86,6 +129,11 @@ class Task(db.Model):
     # Foreign Key to link Task to a Project
     project_id = db.Column(db.Integer, db.ForeignKey('project.id'), nullable=False)
 
+    # Row version for optimistic concurrency: every UPDATE checks and bumps it,
+    # so a write based on a stale read fails instead of silently overwriting
+    version = db.Column(db.Integer, nullable=False, server_default='1')
+    __mapper_args__ = {'version_id_col': version}
+
     @property # Returns the list of assignees as a Python list, @property decorator makes it accessible as an attribute, which is needed for serialization
     def assignees(self):
         """Returns the list of assignees from the JSON text field."""
@@ -104,3 +152,147 @@ class Task(db.Model):
         if not isinstance(value, list): # Ensure value is a list of strings
             raise ValueError("Assignees must be a list of strings.")
         self.assignees_text = json.dumps(value) # Convert list to JSON text for storage
+
+    @validates('status') # Runs every time the status is set, including in the constructor
+    def validate_status(self, key, value):
+        """Keeps completed_at in sync with the DONE column, and notes reopened tasks for the due-date scanner."""
+        if value == 'DONE' and self.status != 'DONE':
+            self.completed_at = datetime.utcnow()
+        elif value != 'DONE':
+            if self.status == 'DONE':
+                self.expiry_set_at = datetime.utcnow()
+            self.completed_at = None
+        return value
+
+    @validates('expiry_date')
+    def validate_expiry_date(self, key, value):
+        """Notes when the deadline changes, for the due-date scanner."""
+        if value != self.expiry_date:
+            self.expiry_set_at = datetime.utcnow()
+        return value
+
+@sharded
+class ArchivePolicy(db.Model):
+    """
+    Per-project rule for moving completed tasks into the archive,
+    e.g. "DONE for more than 30 days".
+    """
+    id = db.Column(db.Integer, primary_key=True)
+    project_id = db.Column(db.Integer, db.ForeignKey('project.id'), nullable=False, unique=True)
+    enabled = db.Column(db.Boolean(), nullable=False, default=True)
+    done_after_days = db.Column(db.Integer, nullable=False, default=30)
+
+@sharded
+class ArchivedTask(db.Model):
+    """
+    Cold copy of a Task that was archived.
+    Kept in its own table so the hot 'task' table and its indexes only hold active work.
+    """
+    __tablename__ = 'archived_task'
+    __table_args__ = (
+        # Archive browsing pages through a project's rows, newest first
+        db.Index('ix_archived_task_project_archived', 'project_id', 'archived_at'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    task_id = db.Column(db.Integer, nullable=False) # ID the task had in the hot table
+    title = db.Column(db.String(200), nullable=False)
+    description = db.Column(db.Text, nullable=True)
+    status = db.Column(db.String(50), nullable=False)
+    order = db.Column(db.Integer, nullable=False, default=0)
+    expiry_date = db.Column(db.DateTime, nullable=True)
+    completed_at = db.Column(db.DateTime, nullable=True)
+    assignees_text = db.Column(db.Text, nullable=True)
+    creator_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=True)
+    project_id = db.Column(db.Integer, db.ForeignKey('project.id'), nullable=False)
+    archived_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    creator = db.relationship('User', foreign_keys=[creator_id])
+
+    @property
+    def assignees(self):
+        """Returns the list of assignees from the JSON text field."""
+        if not self.assignees_text:
+            return []
+        try:
+            return json.loads(self.assignees_text)
+        except json.JSONDecodeError:
+            return []
+
+@sharded
+class DueNotification(db.Model):
+    """
+    Event produced by the due-date scanner when a task becomes due soon or overdue.
+    """
+    __tablename__ = 'due_notification'
+    __table_args__ = (
+        db.Index('ix_due_notification_project_created', 'project_id', 'created_at'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(20), nullable=False) # 'due_soon' or 'overdue'
+    task_id = db.Column(db.Integer, nullable=False, index=True) # No FK, the task may be deleted or archived later
+    project_id = db.Column(db.Integer, db.ForeignKey('project.id'), nullable=False)
+    due_at = db.Column(db.DateTime, nullable=False) # The task's expiry_date when the event was produced
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+class SchedulerState(db.Model):
+    """
+    Small key/value table where scheduled jobs keep their progress,
+    e.g. the watermark up to which the due-date scanner has looked.
+    Rows named 'job:<name>' are the cross-process locks of exclusive jobs (see scheduler.py).
+    """
+    __tablename__ = 'scheduler_state'
+
+    name = db.Column(db.String(100), primary_key=True)
+    watermark = db.Column(db.DateTime, nullable=True)
+    locked_by = db.Column(db.String(100), nullable=True) # Process running the job
+    locked_until = db.Column(db.DateTime, nullable=True) # When a crashed holder's lock expires
+
+@sharded
+class ActivityLog(db.Model):
+    """
+    Append-only history of what happened in a project ("who moved what").
+    Rows are written in batches by the activity buffer (see activity.py).
+    """
+    __tablename__ = 'activity_log'
+    __table_args__ = (
+        # The activity feed pages through a project's events, newest first
+        db.Index('ix_activity_log_project_created', 'project_id', 'created_at'),
+        # The retention job deletes the oldest events
+        db.Index('ix_activity_log_created', 'created_at'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    # No FK either: a flush can write buffered events after their project was deleted,
+    # and one such orphan must not fail the whole bulk insert (the retention job removes them)
+    project_id = db.Column(db.Integer, nullable=False)
+    task_id = db.Column(db.Integer, nullable=True) # No FK, the history outlives deleted tasks
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=True)
+    action = db.Column(db.String(50), nullable=False) # e.g. 'task.created', 'task.moved'
+    details = db.Column(db.Text, nullable=True) # JSON object with action specific data
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    user = db.relationship('User')
+
+class ProjectShard(db.Model):
+    """
+    Catalog directory entry telling which shard holds a project.
+    Its autoincrement key also hands out globally unique project ids when sharding is enabled.
+    """
+    __tablename__ = 'project_shard'
+    __table_args__ = {'sqlite_autoincrement': True} # Never hand out the id of a deleted project again
+
+    project_id = db.Column(db.Integer, primary_key=True)
+    shard_key = db.Column(db.String(50), nullable=False, index=True)
+
+class TaskDirectory(db.Model):
+    """
+    Catalog directory entry telling which project (and so which shard) holds a task.
+    Its autoincrement key also hands out globally unique task ids when sharding is enabled.
+    """
+    __tablename__ = 'task_directory'
+    __table_args__ = {'sqlite_autoincrement': True} # Never hand out the id of a deleted task again
+
+    task_id = db.Column(db.Integer, primary_key=True)
+    project_id = db.Column(db.Integer, nullable=False, index=True)
@@ -0,0 +1,205 @@
+"""
+This file contains the opt-in request profiler.
+
+When PROFILING_ENABLED is set, a request is profiled if an admin sends the
+PROFILING_HEADER header (X-Profile: 1 by default), or at random with probability
+PROFILING_SAMPLE_RATE. A profiled request runs under cProfile and every SQL
+statement it executes is timed. Each profile is saved in PROFILING_DIR as:
+- <id>.prof: the raw pstats dump (open it with snakeviz, flameprof, gprof2dot, ...)
+- <id>.json: request details, SQL statements with timings and the top functions
+Only the newest PROFILING_KEEP profiles are kept. They are listed by the admin routes.
+
+Only one cProfile profiler can be active per process (on Python 3.12+ it is built on
+sys.monitoring), so a sampled request that arrives while another one is being
+profiled is served unprofiled.
+
+When PROFILING_ENABLED is off, no hooks or SQL listeners are installed at all,
+so the profiler costs nothing.
+"""
+
+import cProfile
+import io
+import json
+import os
+import pstats
+import random
+import re
+import threading
+import time
+import uuid
+from datetime import datetime
+
+import sqlalchemy as sa
+from flask import g, request, has_request_context
+from flask_jwt_extended import verify_jwt_in_request, get_jwt_identity
+
+from .models import db, User
+
+PROFILE_ID_PATTERN = re.compile(r'^[0-9]{8}T[0-9]{6}-[0-9a-f]{8}$')
+
+# Held by the request being profiled, see the module docstring
+_profiling_lock = threading.Lock()
+
+class RequestProfiler:
+    """Flask extension that profiles selected requests."""
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('PROFILING_ENABLED', False)
+        app.config.setdefault('PROFILING_SAMPLE_RATE', 0.0) # Fraction of all requests to profile
+        app.config.setdefault('PROFILING_HEADER', 'X-Profile') # Lets admins ask for a profile
+        app.config.setdefault('PROFILING_DIR', os.path.join(app.instance_path, 'profiles'))
+        app.config.setdefault('PROFILING_KEEP', 200) # Number of saved profiles
+        app.config.setdefault('PROFILING_TOP_FUNCTIONS', 30) # Functions listed in the JSON report
+
+        self.app = app
+        app.extensions['profiler'] = self
+
+        if not app.config['PROFILING_ENABLED']:
+            return # Nothing is installed, so disabled profiling has zero overhead
+
+        app.before_request(self._start)
+        app.after_request(self._record_status)
+        app.teardown_request(self._finish)
+
+        with app.app_context():
+            engines = set(db.engines.values())
+        for engine in engines:
+            sa.event.listen(engine, 'before_cursor_execute', self._before_cursor_execute)
+            sa.event.listen(engine, 'after_cursor_execute', self._after_cursor_execute)
+
+    # --- Storage ---
+
+    @property
+    def directory(self):
+        return self.app.config['PROFILING_DIR']
+
+    def list_profiles(self):
+        """Returns the summaries of the saved profiles, newest first."""
+        if not os.path.isdir(self.directory):
+            return []
+        summaries = []
+        for name in sorted(os.listdir(self.directory), reverse=True):
+            if name.endswith('.json'):
+                report = self.load_profile(name[:-len('.json')])
+                if report:
+                    report.pop('sql', None)
+                    report.pop('top_functions', None)
+                    summaries.append(report)
+        return summaries
+
+    def profile_path(self, profile_id, extension):
+        """Returns the path of a profile file, or None for an invalid id."""
+        if not PROFILE_ID_PATTERN.match(profile_id):
+            return None # Never let an id escape the profile directory
+        return os.path.join(self.directory, f'{profile_id}.{extension}')
+
+    def load_profile(self, profile_id):
+        """Returns the JSON report of a profile, or None."""
+        path = self.profile_path(profile_id, 'json')
+        if not path or not os.path.exists(path):
+            return None
+        with open(path) as f:
+            return json.load(f)
+
+    def _prune(self):
+        reports = sorted(n for n in os.listdir(self.directory) if n.endswith('.json'))
+        for name in reports[:-self.app.config['PROFILING_KEEP']]:
+            profile_id = name[:-len('.json')]
+            for extension in ('json', 'prof'):
+                try:
+                    os.remove(self.profile_path(profile_id, extension))
+                except OSError:
+                    pass
+
+    # --- Request hooks ---
+
+    def _requested_by_admin(self):
+        """True if the profiling header was sent by an authenticated admin."""
+        if not request.headers.get(self.app.config['PROFILING_HEADER']):
+            return False
+        try:
+            verify_jwt_in_request(optional=True)
+            user_id = get_jwt_identity()
+        except Exception:
+            return False # Bad or missing token: just serve the request unprofiled
+        if user_id is None:
+            return False
+        user = User.query.get(user_id)
+        return bool(user and user.is_admin)
+
+    def _start(self):
+        if not (self._requested_by_admin() or random.random() < self.app.config['PROFILING_SAMPLE_RATE']):
+            return
+        if not _profiling_lock.acquire(blocking=False):
+            return # Another request of this process is being profiled
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            _profiling_lock.release() # Some other tool is profiling the process
+            return
+        g.profile_sql = []
+        g.profile_started = time.perf_counter()
+        g.profiler = profiler
+
+    def _record_status(self, response):
+        if 'profiler' in g:
+            g.profile_status = response.status_code
+        return response
+
+    def _finish(self, exc):
+        profiler = g.pop('profiler', None)
+        if profiler is None:
+            return
+        try:
+            profiler.disable()
+        finally:
+            _profiling_lock.release()
+        duration = time.perf_counter() - g.profile_started
+
+        now = datetime.utcnow()
+        profile_id = f"{now.strftime('%Y%m%dT%H%M%S')}-{uuid.uuid4().hex[:8]}"
+        os.makedirs(self.directory, exist_ok=True)
+        profiler.dump_stats(self.profile_path(profile_id, 'prof'))
+
+        stats_text = io.StringIO()
+        stats = pstats.Stats(profiler, stream=stats_text)
+        stats.sort_stats('cumulative').print_stats(self.app.config['PROFILING_TOP_FUNCTIONS'])
+
+        sql = g.pop('profile_sql', [])
+        report = {
+            'id': profile_id,
+            'created_at': now.isoformat(),
+            'method': request.method,
+            'path': request.full_path.rstrip('?'),
+            'status': g.get('profile_status', 500 if exc else None),
+            'duration_ms': round(duration * 1000, 3),
+            'sql_count': len(sql),
+            'sql_ms': round(sum(q['duration_ms'] for q in sql), 3),
+            'sql': sql,
+            'top_functions': stats_text.getvalue(),
+        }
+        with open(self.profile_path(profile_id, 'json'), 'w') as f:
+            json.dump(report, f, indent=2)
+        self._prune()
+
+    # --- SQL listeners ---
+
+    @staticmethod
+    def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if has_request_context() and 'profile_sql' in g:
+            conn.info.setdefault('profile_query_start', []).append(time.perf_counter())
+
+    @staticmethod
+    def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if has_request_context() and 'profile_sql' in g and conn.info.get('profile_query_start'):
+            started = conn.info['profile_query_start'].pop()
+            g.profile_sql.append({
+                'statement': statement, # Parameters are left out, they may hold user data
+                'executemany': executemany,
+                'duration_ms': round((time.perf_counter() - started) * 1000, 3),
+            })
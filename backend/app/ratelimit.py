@@ -0,0 +1,209 @@
+"""
+This file contains the rate limiter and the admission control of the API.
+
+Rate limiting: every request is put in an endpoint class ('auth' for login and
+register, 'write' for other non-GET requests, 'read' otherwise) and charged to one
+token bucket: per user when logged in, otherwise (and always for 'auth') per client IP.
+Many users can share one IP behind an office NAT, so IP buckets have their own, higher
+limits. Limits are configured per class in RATELIMIT_LIMITS (users) and
+RATELIMIT_IP_LIMITS (IPs) as "<count>/<second|minute|hour>" (None = unlimited), and
+a request that finds an empty bucket gets a 429 with a Retry-After header.
+Behind a reverse proxy, request.remote_addr is the proxy's address: set
+TRUSTED_PROXY_COUNT so the app reads the client's address from X-Forwarded-For.
+
+Buckets are kept by a backend. The default InMemoryBackend is per worker process;
+to share limits between workers, set RATELIMIT_BACKEND to any object (or
+"module:Class" import path) implementing RateLimitBackend.consume(), e.g. on Redis.
+
+Admission control: at most MAX_CONCURRENT_REQUESTS requests run at once in a worker.
+Extra requests wait up to ADMISSION_WAIT_SECONDS for a slot and are otherwise
+shed with a 503 and Retry-After, before queueing makes latency collapse for everyone.
+
+Rejections are counted and exported through GET /api/admin/ratelimit.
+"""
+
+import importlib
+import math
+import threading
+import time
+from collections import Counter
+
+from flask import g, jsonify, request
+from flask_jwt_extended import verify_jwt_in_request, get_jwt_identity
+
+PERIODS = {'second': 1, 'minute': 60, 'hour': 3600}
+
+# Endpoints that are always in the 'auth' class, whatever the method
+AUTH_ENDPOINTS = {'api.loginresource', 'api.registerresource'}
+
+def parse_limit(limit):
+    """Parses "10/minute" into (burst, tokens per second). Returns None for no limit."""
+    if not limit:
+        return None
+    count, _, period = limit.partition('/')
+    if period not in PERIODS:
+        raise ValueError(f"Invalid rate limit '{limit}', expected <count>/<second|minute|hour>")
+    count = int(count)
+    return count, count / PERIODS[period]
+
+class RateLimitBackend:
+    """Interface of the bucket storage. Implementations must be thread-safe."""
+
+    def consume(self, key, burst, rate, cost=1):
+        """
+        Takes cost tokens from the bucket `key` (capacity burst, refilled at rate tokens/second).
+        Returns (allowed, retry_after_seconds).
+        """
+        raise NotImplementedError
+
+class InMemoryBackend(RateLimitBackend):
+    """Token buckets in a dict, local to the worker process. Also a convenient fake for tests."""
+
+    def __init__(self, max_keys=100000, clock=time.monotonic):
+        self.max_keys = max_keys
+        self.clock = clock
+        self._buckets = {} # key -> (tokens, last refill time)
+        self._lock = threading.Lock()
+
+    def consume(self, key, burst, rate, cost=1):
+        with self._lock:
+            now = self.clock()
+            tokens, updated = self._buckets.get(key, (burst, now))
+            tokens = min(burst, tokens + (now - updated) * rate) # Refill for the elapsed time
+
+            if tokens >= cost:
+                self._buckets[key] = (tokens - cost, now)
+                allowed, retry_after = True, 0
+            else:
+                self._buckets[key] = (tokens, now)
+                allowed, retry_after = False, (cost - tokens) / rate
+
+            if len(self._buckets) > self.max_keys:
+                self._evict_idle_buckets(now)
+            return allowed, retry_after
+
+    def _evict_idle_buckets(self, now):
+        # After the longest period a bucket is full again and holds no information, forget it
+        idle = [k for k, (tokens, updated) in self._buckets.items() if now - updated > PERIODS['hour']]
+        for key in idle:
+            del self._buckets[key]
+
+def load_backend(backend):
+    """Returns the backend instance for the RATELIMIT_BACKEND setting."""
+    if backend is None:
+        return InMemoryBackend()
+    if isinstance(backend, str):
+        module_name, _, class_name = backend.partition(':')
+        return getattr(importlib.import_module(module_name), class_name)()
+    return backend
+
+class RateLimiter:
+    """Flask extension applying rate limits and the concurrency cap to every request."""
+
+    def __init__(self, app=None):
+        self.stats = Counter()
+        self._stats_lock = threading.Lock()
+        self.in_flight = 0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('RATELIMIT_ENABLED', True)
+        app.config.setdefault('RATELIMIT_BACKEND', None) # None = InMemoryBackend
+        app.config.setdefault('RATELIMIT_LIMITS', {'write': '120/minute', 'read': None}) # Per user
+        app.config.setdefault('RATELIMIT_IP_LIMITS', {'auth': '30/minute', 'write': '300/minute', 'read': None}) # Per IP
+        app.config.setdefault('RATELIMIT_ENDPOINT_CLASSES', {}) # Endpoint name -> class overrides
+        app.config.setdefault('MAX_CONCURRENT_REQUESTS', 0) # Per worker, 0 = no cap
+        app.config.setdefault('ADMISSION_WAIT_SECONDS', 0.1)
+
+        self.app = app
+        app.extensions['rate_limiter'] = self
+        self.backend = load_backend(app.config['RATELIMIT_BACKEND'])
+        self.limits = {name: parse_limit(limit) for name, limit in app.config['RATELIMIT_LIMITS'].items()}
+        self.ip_limits = {name: parse_limit(limit) for name, limit in app.config['RATELIMIT_IP_LIMITS'].items()}
+
+        max_concurrent = app.config['MAX_CONCURRENT_REQUESTS']
+        self.slots = threading.BoundedSemaphore(max_concurrent) if max_concurrent > 0 else None
+
+        # The concurrency cap goes first, so shed requests cost as little as possible
+        if self.slots is not None:
+            app.before_request(self._admit)
+            app.teardown_request(self._release)
+        if app.config['RATELIMIT_ENABLED']:
+            app.before_request(self._check_rate_limit)
+
+    def _count(self, name):
+        with self._stats_lock:
+            self.stats[name] += 1
+
+    @staticmethod
+    def _reject(status, message, retry_after):
+        response = jsonify({'message': message})
+        response.status_code = status
+        response.headers['Retry-After'] = str(max(1, math.ceil(retry_after)))
+        return response
+
+    # --- Admission control ---
+
+    def _admit(self):
+        if not self.slots.acquire(timeout=self.app.config['ADMISSION_WAIT_SECONDS']):
+            self._count('rejected_overload')
+            return self._reject(503, 'Server is busy, please retry shortly', 1) # Service Unavailable
+        g.admission_slot = True
+        with self._stats_lock:
+            self.in_flight += 1
+
+    def _release(self, exc):
+        if g.pop('admission_slot', False):
+            with self._stats_lock:
+                self.in_flight -= 1
+            self.slots.release()
+
+    # --- Rate limiting ---
+
+    def endpoint_class(self):
+        """Returns the limit class of the current request."""
+        overrides = self.app.config['RATELIMIT_ENDPOINT_CLASSES']
+        if request.endpoint in overrides:
+            return overrides[request.endpoint]
+        if request.endpoint in AUTH_ENDPOINTS:
+            return 'auth'
+        return 'read' if request.method in ('GET', 'HEAD') else 'write'
+
+    def _check_rate_limit(self):
+        if request.method == 'OPTIONS': # CORS preflights are free
+            return
+        limit_class = self.endpoint_class()
+
+        # Login and register have no user yet, they are always limited per IP
+        user_id = self._current_user_id() if limit_class != 'auth' else None
+        if user_id is not None:
+            key, limit = f'{limit_class}:user:{user_id}', self.limits.get(limit_class)
+        else:
+            key, limit = f'{limit_class}:ip:{request.remote_addr}', self.ip_limits.get(limit_class)
+        if limit is None:
+            return
+
+        burst, rate = limit
+        allowed, retry_after = self.backend.consume(key, burst, rate)
+        if not allowed:
+            self._count(f'rejected_rate_limit:{limit_class}')
+            return self._reject(429, 'Too many requests', retry_after) # Too Many Requests
+
+    @staticmethod
+    def _current_user_id():
+        """The logged-in user's id, or None (bad tokens are left for the route to reject)."""
+        try:
+            verify_jwt_in_request(optional=True)
+            return get_jwt_identity()
+        except Exception:
+            return None
+
+    def snapshot(self):
+        """Returns the counters, for the admin route."""
+        with self._stats_lock:
+            return {
+                'in_flight': self.in_flight,
+                'max_concurrent_requests': self.app.config['MAX_CONCURRENT_REQUESTS'],
+                'rejections': dict(self.stats)
+            }
@@ -0,0 +1,194 @@
+"""
+This file contains a small in-process scheduler for TaskFlow's periodic
+maintenance jobs (archiving old tasks, etc.).
+
+Jobs are plain functions registered with a name and an interval in seconds.
+They run one after the other on a single daemon thread, inside an application
+context. The thread is started lazily on the first request, so it only ever runs
+in the process that actually serves the app (and not in the reloader's parent).
+Any job can also be run once by hand with: flask run-job <name>
+Code can ask for an early run with trigger(), e.g. when a buffer fills up.
+
+Every worker process of a multi-worker server has its own scheduler thread.
+Jobs registered as exclusive take a lock row in scheduler_state first, so they
+never run in two processes at once and run at most once per interval overall.
+A lock left behind by a crashed process expires after SCHEDULER_LOCK_TIMEOUT_SECONDS.
+"""
+
+import logging
+import os
+import socket
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+
+import click
+from sqlalchemy.exc import IntegrityError
+
+from .models import db, SchedulerState
+
+logger = logging.getLogger(__name__)
+
+class Scheduler:
+    """Runs registered jobs periodically on a background thread."""
+
+    def __init__(self, app=None):
+        self.app = None
+        self.jobs = {} # name -> (interval in seconds, function, exclusive)
+        self.owner = f'{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}' # Holder name in lock rows
+        self._thread = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._wake = threading.Event() # Set by stop() and trigger() to end the thread's wait early
+        self._triggered = set() # Jobs to run as soon as possible, whatever their interval
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """Attaches the scheduler to the app and registers the start hook and CLI command."""
+        app.config.setdefault('SCHEDULER_LOCK_TIMEOUT_SECONDS', 3600)
+
+        self.app = app
+        app.extensions['scheduler'] = self
+
+        if app.config.get('SCHEDULER_ENABLED', False):
+            app.before_request(self._start_once)
+
+        @app.cli.command('run-job')
+        @click.argument('name')
+        def run_job_command(name):
+            """Runs a single scheduled job once."""
+            if name not in self.jobs:
+                raise click.BadParameter(f"Unknown job '{name}'. Available: {', '.join(sorted(self.jobs))}")
+            if not self.claim(name, scheduled=False):
+                raise click.ClickException(f"Job '{name}' is already running in another process")
+            try:
+                result = self.run_job(name)
+            finally:
+                self.release(name)
+            click.echo(f'{name}: {result}')
+
+    def add_job(self, name, interval, func, exclusive=False):
+        """
+        Registers (or replaces) a job. A non-positive interval disables it.
+        Exclusive jobs only run in one process at a time (see claim()); leave it off
+        for jobs that work on per-process state, like flushing an in-memory buffer.
+        """
+        self.jobs[name] = (interval, func, exclusive)
+
+    def run_job(self, name):
+        """Runs a job once inside an application context and returns its result."""
+        interval, func, exclusive = self.jobs[name]
+        with self.app.app_context():
+            return func()
+
+    # --- Cross-process lock ---
+
+    def claim(self, name, scheduled=True):
+        """
+        Takes the lock row of an exclusive job. Returns False if another process is
+        running it or, for scheduled runs, if it already started less than an interval ago.
+        Non-exclusive jobs can always run.
+        """
+        interval, func, exclusive = self.jobs[name]
+        if not exclusive:
+            return True
+
+        now = datetime.utcnow()
+        table = SchedulerState.__table__
+        key = f'job:{name}'
+        conditions = [table.c.name == key, db.or_(table.c.locked_until.is_(None), table.c.locked_until <= now)]
+        if scheduled:
+            # The watermark of a lock row is when the job last started, in any process
+            conditions.append(db.or_(table.c.watermark.is_(None), table.c.watermark <= now - timedelta(seconds=interval)))
+        values = {
+            'locked_by': self.owner,
+            'locked_until': now + timedelta(seconds=self.app.config['SCHEDULER_LOCK_TIMEOUT_SECONDS']),
+            'watermark': now,
+        }
+
+        with self.app.app_context():
+            # A single conditional UPDATE, so two processes can never both win
+            with db.engine.begin() as connection:
+                if connection.execute(table.update().where(*conditions).values(**values)).rowcount:
+                    return True
+                if connection.execute(db.select(table.c.name).where(table.c.name == key)).first():
+                    return False
+            try:
+                with db.engine.begin() as connection:
+                    connection.execute(table.insert().values(name=key, **values)) # First run ever
+                return True
+            except IntegrityError:
+                return False # Another process created the row first
+
+    def release(self, name):
+        """Frees the lock row of an exclusive job taken by this process."""
+        interval, func, exclusive = self.jobs[name]
+        if not exclusive:
+            return
+        table = SchedulerState.__table__
+        with self.app.app_context():
+            with db.engine.begin() as connection:
+                connection.execute(table.update().where(
+                    table.c.name == f'job:{name}', table.c.locked_by == self.owner
+                ).values(locked_by=None, locked_until=None))
+
+    def start(self):
+        """Starts the background thread (no-op if it is already running)."""
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._loop, name='taskflow-scheduler', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        """Asks the background thread to exit after the current job."""
+        self._stop.set()
+        self._wake.set()
+
+    def trigger(self, name):
+        """
+        Asks the background thread to run a job as soon as it is free, without waiting for
+        its interval. Cheap enough to call from a request. Returns False if the thread is not running.
+        """
+        if self._thread is None or not self._thread.is_alive():
+            return False
+        with self._lock:
+            self._triggered.add(name)
+        self._wake.set()
+        return True
+
+    def _start_once(self):
+        # before_request hook: cheap check once the thread is running
+        if self._thread is None:
+            self.start()
+
+    def _loop(self):
+        now = time.monotonic()
+        next_runs = {name: now + interval for name, (interval, func, exclusive) in self.jobs.items()}
+
+        while True:
+            self._wake.wait(1)
+            self._wake.clear()
+            if self._stop.is_set():
+                break
+            with self._lock:
+                triggered, self._triggered = self._triggered, set()
+
+            for name, (interval, func, exclusive) in list(self.jobs.items()):
+                if name not in triggered and (interval <= 0 or time.monotonic() < next_runs.get(name, 0)):
+                    continue
+                try:
+                    if self.claim(name):
+                        try:
+                            result = self.run_job(name)
+                        finally:
+                            self.release(name)
+                        logger.info('Scheduled job %s finished: %s', name, result)
+                    else:
+                        logger.debug('Scheduled job %s skipped, it ran or runs in another process', name)
+                except Exception:
+                    # A failing job must never kill the scheduler thread
+                    logger.exception('Scheduled job %s failed', name)
+                next_runs[name] = time.monotonic() + interval
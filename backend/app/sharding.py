@@ -0,0 +1,373 @@
+"""
+This file contains the shard router, which spreads projects over several databases.
+
+With SHARD_DATABASE_URIS set, the default database (SQLALCHEMY_DATABASE_URI) becomes
+the global catalog: it holds users, project memberships and the directory that maps
+every project (and task) to its shard. All per-project tables (projects, tasks,
+archive, ...) live in one of the shard databases, so a busy team's writes only lock
+their own shard. Without SHARD_DATABASE_URIS everything stays in the default database
+and the router is a no-op.
+
+Routes select a shard with shard_router.bind_project() / bind_task(); the session then
+sends every statement that touches a sharded table to that shard's engine.
+SQLite shards get the catalog attached, so queries can still join memberships and users.
+For PostgreSQL, use one schema per shard and put it in front of the catalog schema
+in the connection's search_path (e.g. ?options=-csearch_path%3Dshard1,public).
+The sharded tables are then only created in the shards (see create_catalog_tables()),
+and no catalog table has a foreign key to them: project_members.project_id is a plain
+column, since its project lives in another schema or database.
+
+Projects can be moved between shards with: flask shards move <project_id> <shard>
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+import click
+import sqlalchemy as sa
+from flask import current_app, g, has_app_context
+from flask_sqlalchemy.session import Session as FlaskSession
+from sqlalchemy.sql.util import find_tables
+
+SHARD_KEY_PREFIX = 'shard'
+
+# Sharded tables whose ids are handed out by the catalog directory, so they are the same
+# on every shard. All other sharded tables number their rows per shard.
+GLOBAL_ID_TABLES = {'project', 'task'}
+
+def sharded(model):
+    """Class decorator marking a model's table as living in the shards."""
+    model.__table__.info['sharded'] = True
+    return model
+
+class ShardNotSelected(RuntimeError):
+    """A sharded table was used before the request selected a shard."""
+
+class ShardedSession(FlaskSession):
+    """Session that routes statements on sharded tables to the current shard's engine."""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is not None or not has_app_context():
+            return super().get_bind(mapper, clause=clause, bind=bind, **kwargs)
+
+        router = current_app.extensions.get('shard_router')
+        if router is None or not router.enabled:
+            return super().get_bind(mapper, clause=clause, bind=bind, **kwargs)
+
+        if router.touches_sharded_table(mapper, clause):
+            return router.current_engine()
+        return super().get_bind(mapper, clause=clause, bind=bind, **kwargs)
+
+class ShardRouter:
+    """Maps projects to shard engines and selects the shard used by the current session."""
+
+    def __init__(self, app=None):
+        self.app = None
+        self.executor = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """Registers the router. Must be called after db.init_app(app)."""
+        from .models import db
+
+        self.app = app
+        app.extensions['shard_router'] = self
+        self.keys = app.config.get('SHARD_KEYS', [])
+
+        if self.enabled:
+            with app.app_context():
+                catalog = db.engine
+                for key in self.keys:
+                    engine = db.engines[key]
+                    if engine.dialect.name == 'sqlite' and catalog.dialect.name == 'sqlite':
+                        self._attach_catalog(engine, catalog.url.database)
+            # Used by fan_out() to query every shard at once
+            self.executor = ThreadPoolExecutor(max_workers=len(self.keys), thread_name_prefix='taskflow-shard')
+
+        self._register_commands(app)
+
+    @property
+    def enabled(self):
+        return bool(self.keys)
+
+    # --- Engine selection ---
+
+    @staticmethod
+    def _attach_catalog(engine, catalog_path):
+        """Attaches the catalog to every new SQLite shard connection, for joins on users and memberships."""
+        @sa.event.listens_for(engine, 'connect')
+        def attach(dbapi_connection, connection_record):
+            cursor = dbapi_connection.cursor()
+            cursor.execute('ATTACH DATABASE ? AS catalog', (catalog_path,))
+            cursor.close()
+
+    @staticmethod
+    def touches_sharded_table(mapper, clause):
+        """Returns True if the mapper's table or any table in the statement is sharded."""
+        if mapper is not None and sa.inspect(mapper).local_table.info.get('sharded'):
+            return True
+        if clause is not None:
+            return any(table.info.get('sharded') for table in find_tables(clause, include_crud=True))
+        return False
+
+    def engine_for(self, key):
+        """Returns the engine of a shard (or the default engine when key is None)."""
+        from .models import db
+        return db.engines[key] if key is not None else db.engine
+
+    def current_engine(self):
+        key = g.get('shard_key')
+        if key is None:
+            raise ShardNotSelected('A sharded table was used before a shard was selected')
+        return self.engine_for(key)
+
+    def shard_keys(self):
+        """Returns every shard key ([None] when sharding is disabled)."""
+        return list(self.keys) if self.enabled else [None]
+
+    def use_shard(self, key):
+        """Selects the shard used by the session for the rest of the app context."""
+        g.shard_key = key
+
+    @contextmanager
+    def shard(self, key):
+        """Selects a shard for the duration of a with-block."""
+        previous = g.get('shard_key')
+        g.shard_key = key
+        try:
+            yield key
+        finally:
+            g.shard_key = previous
+
+    def each_shard(self):
+        """Yields every shard key with that shard selected (for scheduled jobs)."""
+        from .models import db
+        for key in self.shard_keys():
+            with self.shard(key):
+                yield key
+            # Row ids are only unique within a shard, never mix rows of two shards in one identity map
+            db.session.expunge_all()
+
+    # --- Directory ---
+
+    def shard_for_project(self, project_id):
+        """Returns the shard key of a project (None if unknown or sharding is disabled)."""
+        if not self.enabled:
+            return None
+        from .models import db, ProjectShard
+        return db.session.query(ProjectShard.shard_key).filter_by(project_id=project_id).scalar()
+
+    def shards_for_projects(self, project_ids):
+        """Groups project ids by shard key with a single catalog query."""
+        if not self.enabled:
+            return {None: list(project_ids)} if project_ids else {}
+        from .models import db, ProjectShard
+        groups = {}
+        rows = db.session.query(ProjectShard.project_id, ProjectShard.shard_key).filter(
+            ProjectShard.project_id.in_(project_ids)
+        )
+        for project_id, key in rows:
+            groups.setdefault(key, []).append(project_id)
+        return groups
+
+    def bind_project(self, project_id):
+        """Selects the shard of a project. Returns False if the project is unknown."""
+        if not self.enabled:
+            return True
+        key = self.shard_for_project(project_id)
+        if key is None:
+            return False
+        self.use_shard(key)
+        return True
+
+    def bind_task(self, task_id):
+        """Selects the shard of a task's project. Returns False if the task is unknown."""
+        if not self.enabled:
+            return True
+        from .models import db, ProjectShard, TaskDirectory
+        key = db.session.query(ProjectShard.shard_key).join(
+            TaskDirectory, TaskDirectory.project_id == ProjectShard.project_id
+        ).filter(TaskDirectory.task_id == task_id).scalar()
+        if key is None:
+            return False
+        self.use_shard(key)
+        return True
+
+    def allocate_project(self):
+        """
+        Places a new project on the shard with the fewest projects and selects it.
+        Returns the project id to use (None when sharding is disabled).
+        """
+        if not self.enabled:
+            return None
+        from .models import db, ProjectShard
+        counts = dict(db.session.query(ProjectShard.shard_key, db.func.count()).group_by(ProjectShard.shard_key))
+        key = min(self.keys, key=lambda k: counts.get(k, 0))
+
+        entry = ProjectShard(shard_key=key)
+        db.session.add(entry)
+        db.session.flush() # The catalog allocates globally unique project ids
+        self.use_shard(key)
+        return entry.project_id
+
+    def allocate_task_id(self, project_id):
+        """Registers a new task in the directory and returns its id (None when sharding is disabled)."""
+        if not self.enabled:
+            return None
+        from .models import db, TaskDirectory
+        entry = TaskDirectory(project_id=project_id)
+        db.session.add(entry)
+        db.session.flush() # The catalog allocates globally unique task ids
+        return entry.task_id
+
+    def forget_project(self, project_id):
+        """Removes a deleted project (and its tasks) from the directory. The caller commits."""
+        if not self.enabled:
+            return
+        from .models import ProjectShard, TaskDirectory
+        TaskDirectory.query.filter_by(project_id=project_id).delete(synchronize_session=False)
+        ProjectShard.query.filter_by(project_id=project_id).delete(synchronize_session=False)
+
+    def forget_task(self, task_id):
+        """Removes a deleted task from the directory. The caller commits."""
+        if not self.enabled:
+            return
+        from .models import TaskDirectory
+        TaskDirectory.query.filter_by(task_id=task_id).delete(synchronize_session=False)
+
+    def forget_tasks(self, task_ids):
+        """Removes a batch of deleted (or archived) tasks from the directory. The caller commits."""
+        if not self.enabled or not task_ids:
+            return
+        from .models import TaskDirectory
+        TaskDirectory.query.filter(TaskDirectory.task_id.in_(task_ids)).delete(synchronize_session=False)
+
+    # --- Fan-out queries ---
+
+    def fan_out(self, func, project_ids=None):
+        """
+        Calls func(session, project_ids_in_shard) on every shard holding one of the
+        project ids (or on every shard if project_ids is None), in parallel, and
+        returns the concatenated results. func gets its own plain session and runs
+        outside the app context, so it must not use Model.query or db.session.
+        """
+        if project_ids is None:
+            groups = {key: None for key in self.shard_keys()}
+        else:
+            groups = self.shards_for_projects(project_ids)
+
+        engines = {key: self.engine_for(key) for key in groups}
+
+        def run(key):
+            with sa.orm.Session(bind=engines[key]) as session:
+                return func(session, groups[key])
+
+        if len(groups) <= 1:
+            results = [run(key) for key in groups] # Nothing to parallelize
+        else:
+            results = list(self.executor.map(run, groups))
+        return [item for result in results for item in result]
+
+    # --- Maintenance ---
+
+    def create_catalog_tables(self):
+        """Creates the catalog tables in the default database (every table when sharding is disabled)."""
+        from .models import db
+        if not self.enabled:
+            db.create_all()
+            return
+        tables = [t for t in db.metadata.sorted_tables if not t.info.get('sharded')]
+        db.metadata.create_all(db.engine, tables=tables)
+
+    def create_shard_tables(self):
+        """Creates the sharded tables in every shard database."""
+        from .models import db
+        tables = [t for t in db.metadata.sorted_tables if t.info.get('sharded')]
+        for key in self.keys:
+            db.metadata.create_all(self.engine_for(key), tables=tables)
+
+    def move_project(self, project_id, target_key):
+        """
+        Copies a project's rows to another shard, repoints the directory, then deletes the old rows.
+        Projects and tasks keep their ids; rows of the other tables (archived tasks, activity, ...)
+        get new ids on the target shard, so e.g. archived task restore links must be fetched again.
+        Writes to the project made while it is being moved are lost, so run it during a quiet period.
+        Returns the number of copied rows.
+        """
+        from .models import db, ProjectShard
+        entry = ProjectShard.query.get(project_id)
+        if entry is None:
+            raise ValueError(f'Project {project_id} is not in the shard directory')
+        if target_key not in self.keys:
+            raise ValueError(f"Unknown shard '{target_key}'")
+        if entry.shard_key == target_key:
+            return 0
+
+        tables = [t for t in db.metadata.sorted_tables if t.info.get('sharded')]
+        source = self.engine_for(entry.shard_key)
+        target = self.engine_for(target_key)
+
+        def project_filter(table):
+            return (table.c.id if table.name == 'project' else table.c.project_id) == project_id
+
+        def copied_columns(table):
+            # Per-shard ids would collide with the target's own rows, let the target number them
+            if table.name in GLOBAL_ID_TABLES:
+                return list(table.c)
+            return [column for column in table.c if column.name != 'id']
+
+        # 1. Copy, parents first, in one transaction on the target
+        copied = 0
+        with source.connect() as src, target.begin() as dst:
+            for table in tables:
+                query = sa.select(*copied_columns(table)).where(project_filter(table))
+                rows = [dict(row) for row in src.execute(query).mappings()]
+                if rows:
+                    dst.execute(table.insert(), rows)
+                    copied += len(rows)
+
+        # 2. From now on requests go to the target shard
+        entry.shard_key = target_key
+        db.session.commit()
+
+        # 3. Remove the old copy, children first
+        with source.begin() as src:
+            for table in reversed(tables):
+                src.execute(table.delete().where(project_filter(table)))
+
+        return copied
+
+    def _register_commands(self, app):
+        router = self
+
+        @app.cli.group('shards')
+        def shards_group():
+            """Shard maintenance commands."""
+
+        @shards_group.command('status')
+        def status_command():
+            """Shows how many projects each shard holds."""
+            from .models import db, ProjectShard
+            counts = dict(db.session.query(ProjectShard.shard_key, db.func.count()).group_by(ProjectShard.shard_key))
+            for key in router.keys:
+                click.echo(f'{key}: {counts.get(key, 0)} projects')
+
+        @shards_group.command('create-tables')
+        def create_tables_command():
+            """Creates the sharded tables in every shard database."""
+            router.create_shard_tables()
+            click.echo(f'Created tables in {len(router.keys)} shards')
+
+        @shards_group.command('move')
+        @click.argument('project_id', type=int)
+        @click.argument('target')
+        def move_command(project_id, target):
+            """Moves a project to another shard."""
+            try:
+                copied = router.move_project(project_id, target)
+            except ValueError as e:
+                raise click.ClickException(str(e))
+            click.echo(f'Moved project {project_id} to {target} ({copied} rows)')
+
+shard_router = ShardRouter()
@@ -0,0 +1,84 @@
+"""
+Benchmark: CPU cost of response compression against bytes saved, on a synthetic board payload.
+
+Uses the same settings as app/compression.py (gzip with mtime=0, brotli quality levels)
+and also measures a cache hit of the compressed payload cache (hashing the body).
+
+Run from the backend directory:
+    python benchmarks/bench_compression.py [number_of_tasks ...]
+"""
+
+import gzip
+import hashlib
+import json
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+try:
+    import brotli
+except ImportError: # Optional dependency
+    brotli = None
+
+STATUSES = ['TODO', 'IN_PROGRESS', 'DONE']
+WORDS = ['fix', 'login', 'board', 'drag', 'api', 'update', 'member', 'review', 'deploy', 'docs',
+         'cleanup', 'design', 'modal', 'column', 'order', 'cookie', 'token', 'project', 'task', 'test']
+
+def build_board(task_count, member_count=25, seed=42):
+    """Builds a board payload shaped like ProjectResource.get's response."""
+    rng = random.Random(seed)
+    members = [{'id': i, 'email': f'user{i}@example.com', 'role': 'member'} for i in range(1, member_count + 1)]
+    start = datetime(2024, 1, 1)
+    tasks = []
+    for i in range(1, task_count + 1):
+        creator = rng.choice(members)
+        tasks.append({
+            'id': i,
+            'title': ' '.join(rng.choice(WORDS) for _ in range(rng.randint(2, 6))).capitalize(),
+            'description': ' '.join(rng.choice(WORDS) for _ in range(rng.randint(0, 30))) or None,
+            'status': rng.choice(STATUSES),
+            'order': i,
+            'project_id': 1,
+            'expiry_date': (start + timedelta(days=rng.randint(0, 365))).isoformat() if rng.random() < 0.5 else None,
+            'creator': {'id': creator['id'], 'email': creator['email']},
+            'assignees': [rng.choice(members)['email'] for _ in range(rng.randint(0, 3))],
+        })
+    return {'id': 1, 'name': 'Benchmark', 'description': None, 'members': members, 'tasks': tasks}
+
+def time_call(func, min_time=0.2):
+    """Returns the average seconds per call, repeating until min_time has elapsed."""
+    calls = 0
+    start = time.perf_counter()
+    while True:
+        result = func()
+        calls += 1
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time:
+            return elapsed / calls, result
+
+def main(task_counts):
+    codecs = [('gzip', level, lambda b, l=level: gzip.compress(b, compresslevel=l, mtime=0)) for level in (1, 6, 9)]
+    if brotli is not None:
+        codecs += [('br', level, lambda b, l=level: brotli.compress(b, quality=l)) for level in (1, 4, 5, 11)]
+    else:
+        print('brotli is not installed, only gzip is measured\n')
+
+    print(f"{'tasks':>7} {'codec':>6} {'level':>5} {'raw KiB':>9} {'out KiB':>9} {'ratio':>6} {'ms':>9} {'MiB/s':>8}")
+    for count in task_counts:
+        body = json.dumps(build_board(count)).encode()
+        raw_kib = len(body) / 1024
+
+        for name, level, compress in codecs:
+            seconds, out = time_call(lambda: compress(body))
+            print(f'{count:>7} {name:>6} {level:>5} {raw_kib:>9.1f} {len(out) / 1024:>9.1f} '
+                  f'{len(body) / len(out):>6.1f} {seconds * 1000:>9.2f} {len(body) / seconds / 2**20:>8.1f}')
+
+        # A cache hit only costs hashing the uncompressed body
+        seconds, _ = time_call(lambda: hashlib.blake2b(body, digest_size=16).digest())
+        print(f"{count:>7} {'cached':>6} {'-':>5} {raw_kib:>9.1f} {'-':>9} {'-':>6} {seconds * 1000:>9.2f} "
+              f'{len(body) / seconds / 2**20:>8.1f}')
+        print()
+
+if __name__ == '__main__':
+    main([int(arg) for arg in sys.argv[1:]] or [100, 1000, 10000])
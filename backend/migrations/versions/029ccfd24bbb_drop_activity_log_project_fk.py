@@ -0,0 +1,51 @@
+"""Drop the activity_log.project_id foreign key
+
+Revision ID: 029ccfd24bbb
+Revises: fac66b5eb8fd
+Create Date: 2026-10-19 14:00:00.000000
+
+The activity buffer can write the events of a project deleted after they were
+buffered. With the foreign key, one such event failed the bulk insert of every
+other event of the flush, over and over (see ActivityLog). SQLite leaves the
+constraint unnamed, the naming convention gives the reflected copy a name batch
+mode can drop. Skipped when the foreign key is already gone.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '029ccfd24bbb'
+down_revision = 'fac66b5eb8fd'
+branch_labels = None
+depends_on = None
+
+NAMING_CONVENTION = {'fk': 'fk_%(table_name)s_%(column_0_name)s_%(referred_table_name)s'}
+DEFAULT_NAME = 'fk_activity_log_project_id_project'
+
+
+def project_foreign_key():
+    """Returns the reflected foreign key from activity_log.project_id to project, or None."""
+    inspector = sa.inspect(op.get_bind())
+    if 'activity_log' not in inspector.get_table_names():
+        return None
+    for foreign_key in inspector.get_foreign_keys('activity_log'):
+        if foreign_key['referred_table'] == 'project' and foreign_key['constrained_columns'] == ['project_id']:
+            return foreign_key
+    return None
+
+
+def upgrade():
+    foreign_key = project_foreign_key()
+    if foreign_key is None:
+        return
+    with op.batch_alter_table('activity_log', naming_convention=NAMING_CONVENTION) as batch_op:
+        batch_op.drop_constraint(foreign_key['name'] or DEFAULT_NAME, type_='foreignkey')
+
+
+def downgrade():
+    inspector = sa.inspect(op.get_bind())
+    if 'activity_log' not in inspector.get_table_names() or project_foreign_key() is not None:
+        return
+    with op.batch_alter_table('activity_log') as batch_op:
+        batch_op.create_foreign_key(DEFAULT_NAME, 'project', ['project_id'], ['id'])
@@ -0,0 +1,34 @@
+"""Add task.version, the row version used for optimistic concurrency
+
+Revision ID: 51c778857282
+Revises: bb6b12d171e9
+Create Date: 2026-10-19 11:00:00.000000
+
+Existing tasks start at version 1. Skipped when the column already exists.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '51c778857282'
+down_revision = 'bb6b12d171e9'
+branch_labels = None
+depends_on = None
+
+
+def has_version_column():
+    inspector = sa.inspect(op.get_bind())
+    return 'task' in inspector.get_table_names() and 'version' in {c['name'] for c in inspector.get_columns('task')}
+
+
+def upgrade():
+    if 'task' in sa.inspect(op.get_bind()).get_table_names() and not has_version_column():
+        with op.batch_alter_table('task') as batch_op:
+            batch_op.add_column(sa.Column('version', sa.Integer(), nullable=False, server_default='1'))
+
+
+def downgrade():
+    if has_version_column():
+        with op.batch_alter_table('task') as batch_op:
+            batch_op.drop_column('version')
@@ -0,0 +1,55 @@
+"""Add task.expiry_set_at and the indexes of the due-date scanner
+
+Revision ID: 641c14509db0
+Revises: f54d10a2ac97
+Create Date: 2026-10-19 12:00:00.000000
+
+ix_task_expiry_status serves the scan by deadline, task.expiry_set_at and its index
+the scan by when the deadline was set (see app/due.py). Existing tasks keep a NULL
+expiry_set_at: their deadlines are already covered by the scan by deadline.
+Every step is skipped when it is already applied.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '641c14509db0'
+down_revision = 'f54d10a2ac97'
+branch_labels = None
+depends_on = None
+
+NEW_INDEXES = [
+    ('ix_task_expiry_status', ['expiry_date', 'status']),
+    ('ix_task_expiry_set_at', ['expiry_set_at']),
+]
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+    if 'task' not in inspector.get_table_names():
+        return
+
+    if 'expiry_set_at' not in {c['name'] for c in inspector.get_columns('task')}:
+        with op.batch_alter_table('task') as batch_op:
+            batch_op.add_column(sa.Column('expiry_set_at', sa.DateTime(), nullable=True))
+
+    indexes = {i['name'] for i in sa.inspect(op.get_bind()).get_indexes('task')}
+    for name, columns in NEW_INDEXES:
+        if name not in indexes:
+            op.create_index(name, 'task', columns)
+
+
+def downgrade():
+    inspector = sa.inspect(op.get_bind())
+    if 'task' not in inspector.get_table_names():
+        return
+
+    indexes = {i['name'] for i in inspector.get_indexes('task')}
+    for name, columns in reversed(NEW_INDEXES):
+        if name in indexes:
+            op.drop_index(name, table_name='task')
+
+    if 'expiry_set_at' in {c['name'] for c in inspector.get_columns('task')}:
+        with op.batch_alter_table('task') as batch_op:
+            batch_op.drop_column('expiry_set_at')
@@ -0,0 +1,34 @@
+"""Add ix_project_members_project_user, for member lookups and paging by project
+
+Revision ID: 645b1ab8faaf
+Revises: b43df2add2a2
+Create Date: 2026-10-19 11:45:00.000000
+
+The primary key starts with user_id, so "members of a project" scanned the whole
+table. Skipped when the index already exists.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '645b1ab8faaf'
+down_revision = 'b43df2add2a2'
+branch_labels = None
+depends_on = None
+
+
+def has_index():
+    inspector = sa.inspect(op.get_bind())
+    return ('project_members' in inspector.get_table_names()
+            and 'ix_project_members_project_user' in {i['name'] for i in inspector.get_indexes('project_members')})
+
+
+def upgrade():
+    if 'project_members' in sa.inspect(op.get_bind()).get_table_names() and not has_index():
+        op.create_index('ix_project_members_project_user', 'project_members', ['project_id', 'user_id'])
+
+
+def downgrade():
+    if has_index():
+        op.drop_index('ix_project_members_project_user', table_name='project_members')
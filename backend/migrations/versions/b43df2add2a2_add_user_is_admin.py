@@ -0,0 +1,34 @@
+"""Add user.is_admin, the flag guarding the admin routes
+
+Revision ID: b43df2add2a2
+Revises: 51c778857282
+Create Date: 2026-10-19 11:30:00.000000
+
+Existing users are not admins. Skipped when the column already exists.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b43df2add2a2'
+down_revision = '51c778857282'
+branch_labels = None
+depends_on = None
+
+
+def has_is_admin_column():
+    inspector = sa.inspect(op.get_bind())
+    return 'user' in inspector.get_table_names() and 'is_admin' in {c['name'] for c in inspector.get_columns('user')}
+
+
+def upgrade():
+    if 'user' in sa.inspect(op.get_bind()).get_table_names() and not has_is_admin_column():
+        with op.batch_alter_table('user') as batch_op:
+            batch_op.add_column(sa.Column('is_admin', sa.Boolean(), nullable=False, server_default=sa.false()))
+
+
+def downgrade():
+    if has_is_admin_column():
+        with op.batch_alter_table('user') as batch_op:
+            batch_op.drop_column('is_admin')
@@ -0,0 +1,65 @@
+"""Add task.completed_at, its archive index and the scheduler lock columns
+
+Revision ID: bb6b12d171e9
+Revises: 
+Create Date: 2026-10-19 11:00:00.000000
+
+db.create_all() (run.py) creates new tables but never alters an existing one.
+Every step is skipped when it is already applied, so the revision is also safe
+on a database freshly created by db.create_all().
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'bb6b12d171e9'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def column_names(inspector, table):
+    return {c['name'] for c in inspector.get_columns(table)}
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+    tables = set(inspector.get_table_names())
+
+    if 'task' in tables:
+        if 'completed_at' not in column_names(inspector, 'task'):
+            with op.batch_alter_table('task') as batch_op:
+                batch_op.add_column(sa.Column('completed_at', sa.DateTime(), nullable=True))
+        # Start the archive clock of tasks that were already DONE at the upgrade
+        op.execute("UPDATE task SET completed_at = CURRENT_TIMESTAMP WHERE status = 'DONE' AND completed_at IS NULL")
+        if 'ix_task_project_status_completed' not in {i['name'] for i in inspector.get_indexes('task')}:
+            op.create_index('ix_task_project_status_completed', 'task', ['project_id', 'status', 'completed_at'])
+
+    # Cross-process locks of the scheduled jobs
+    if 'scheduler_state' in tables:
+        existing = column_names(inspector, 'scheduler_state')
+        with op.batch_alter_table('scheduler_state') as batch_op:
+            if 'locked_by' not in existing:
+                batch_op.add_column(sa.Column('locked_by', sa.String(length=100), nullable=True))
+            if 'locked_until' not in existing:
+                batch_op.add_column(sa.Column('locked_until', sa.DateTime(), nullable=True))
+
+
+def downgrade():
+    inspector = sa.inspect(op.get_bind())
+    tables = set(inspector.get_table_names())
+
+    if 'scheduler_state' in tables:
+        existing = column_names(inspector, 'scheduler_state')
+        with op.batch_alter_table('scheduler_state') as batch_op:
+            for name in ('locked_until', 'locked_by'):
+                if name in existing:
+                    batch_op.drop_column(name)
+
+    if 'task' in tables:
+        if 'ix_task_project_status_completed' in {i['name'] for i in inspector.get_indexes('task')}:
+            op.drop_index('ix_task_project_status_completed', table_name='task')
+        if 'completed_at' in column_names(inspector, 'task'):
+            with op.batch_alter_table('task') as batch_op:
+                batch_op.drop_column('completed_at')
@@ -0,0 +1,27 @@
+"""Placeholder for the former shared upgrade of existing databases
+
+Revision ID: f54d10a2ac97
+Revises: 645b1ab8faaf
+Create Date: 2026-10-19 10:00:00.000000
+
+This revision used to add several columns and indexes at once. Each of them now has
+its own revision: bb6b12d171e9 (task.completed_at, scheduler locks), 51c778857282
+(task.version), b43df2add2a2 (user.is_admin) and 645b1ab8faaf (project_members index).
+It is kept, empty, so databases already stamped with it stay on the chain; their
+columns and indexes exist, and the revisions before it skip them.
+"""
+
+
+# revision identifiers, used by Alembic.
+revision = 'f54d10a2ac97'
+down_revision = '645b1ab8faaf'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    pass
+
+
+def downgrade():
+    pass
@@ -0,0 +1,50 @@
+"""Drop the project_members.project_id foreign key
+
+Revision ID: fac66b5eb8fd
+Revises: 641c14509db0
+Create Date: 2026-10-19 13:00:00.000000
+
+With sharding enabled a project lives in a shard database while its memberships stay
+in the catalog, so the catalog cannot reference project.id (see ProjectMember).
+SQLite leaves the constraint unnamed, the naming convention gives the reflected copy
+a name batch mode can drop. Skipped when the foreign key is already gone.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'fac66b5eb8fd'
+down_revision = '641c14509db0'
+branch_labels = None
+depends_on = None
+
+NAMING_CONVENTION = {'fk': 'fk_%(table_name)s_%(column_0_name)s_%(referred_table_name)s'}
+DEFAULT_NAME = 'fk_project_members_project_id_project'
+
+
+def project_foreign_key():
+    """Returns the reflected foreign key from project_members.project_id to project, or None."""
+    inspector = sa.inspect(op.get_bind())
+    if 'project_members' not in inspector.get_table_names():
+        return None
+    for foreign_key in inspector.get_foreign_keys('project_members'):
+        if foreign_key['referred_table'] == 'project' and foreign_key['constrained_columns'] == ['project_id']:
+            return foreign_key
+    return None
+
+
+def upgrade():
+    foreign_key = project_foreign_key()
+    if foreign_key is None:
+        return
+    with op.batch_alter_table('project_members', naming_convention=NAMING_CONVENTION) as batch_op:
+        batch_op.drop_constraint(foreign_key['name'] or DEFAULT_NAME, type_='foreignkey')
+
+
+def downgrade():
+    inspector = sa.inspect(op.get_bind())
+    if 'project_members' not in inspector.get_table_names() or project_foreign_key() is not None:
+        return
+    with op.batch_alter_table('project_members') as batch_op:
+        batch_op.create_foreign_key(DEFAULT_NAME, 'project', ['project_id'], ['id'])
@@ -2,16 +2,17 @@
 The main entry point for the Flask application.
 """
 
-# Import the factory function and the db instance
+# Import the factory function and the shard router, which creates the tables
 from app import create_app
-from app.models import db
+from app.sharding import shard_router
 
 # 1. Call the factory to create the application instance
 app = create_app()
 
 # 2. Use the 'app' instance to create an application context
 with app.app_context():
-    db.create_all()
+    shard_router.create_catalog_tables() # Every table, or only the catalog ones when shards are configured
+    shard_router.create_shard_tables() # Only does something when shards are configured
 
 if __name__ == '__main__':
     # 3. Call .run() on the 'app' instance, not the factory
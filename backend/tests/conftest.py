@@ -0,0 +1,65 @@
+"""
+Fixtures shared by the backend tests: an app with two SQLite shard databases
+and logged-in test clients.
+Run from the backend directory with: python -m pytest
+"""
+
+from contextlib import contextmanager
+
+import pytest
+
+from app import create_app
+from app.activity import activity_log
+from app.sharding import shard_router
+
+PASSWORD = 'correct-horse'
+
+@pytest.fixture
+def app_config():
+    """Extra settings for the app fixture. Override this fixture in a test module to change them."""
+    return {}
+
+@pytest.fixture
+def app(tmp_path, app_config):
+    app = create_app({
+        'TESTING': True,
+        'SQLALCHEMY_DATABASE_URI': f'sqlite:///{tmp_path / "catalog.db"}',
+        'SHARD_KEYS': ['shard0', 'shard1'],
+        'SQLALCHEMY_BINDS': {
+            'shard0': f'sqlite:///{tmp_path / "shard0.db"}',
+            'shard1': f'sqlite:///{tmp_path / "shard1.db"}',
+        },
+        'SCHEDULER_ENABLED': False,
+        'RATELIMIT_ENABLED': False,
+        **app_config,
+    })
+    with app.app_context():
+        shard_router.create_catalog_tables()
+        shard_router.create_shard_tables()
+    yield app
+    activity_log.flush()
+
+@pytest.fixture
+def login(app):
+    """Returns a function registering (if needed) and logging in a user, which returns their test client."""
+    def login(email):
+        client = app.test_client()
+        client.post('/api/register', json={'email': email, 'password': PASSWORD})
+        client.post('/api/login', json={'email': email, 'password': PASSWORD})
+        client.environ_base['HTTP_X_CSRF_TOKEN'] = client.get_cookie('csrf_access_token').value
+        return client
+    return login
+
+@pytest.fixture
+def client(login):
+    return login('owner@example.com')
+
+@pytest.fixture
+def project_shard(app):
+    """Returns a context manager running a block in an app context bound to a project's shard."""
+    @contextmanager
+    def bound(project_id):
+        with app.app_context():
+            assert shard_router.bind_project(project_id)
+            yield
+    return bound
@@ -0,0 +1,131 @@
+"""
+Tests for the archive job and the archive routes.
+"""
+
+from datetime import datetime, timedelta
+
+import pytest
+import sqlalchemy as sa
+
+from app.archive import archive_completed_tasks
+from app.models import db, Task, TaskDirectory
+from app.sharding import shard_router
+
+@pytest.fixture
+def app_config():
+    return {'ARCHIVE_BATCH_SIZE': 2}
+
+def make_project(client, done_after_days=30):
+    project_id = client.post('/api/projects', json={'name': 'archive'}).json['id']
+    client.put(f'/api/projects/{project_id}/archive-policy', json={'enabled': True, 'done_after_days': done_after_days})
+    return project_id
+
+def add_task(client, project_id, title, status='TODO'):
+    return client.post(f'/api/projects/{project_id}/tasks', json={'title': title, 'status': status}).json['id']
+
+def complete_days_ago(project_shard, project_id, task_ids, days):
+    with project_shard(project_id):
+        Task.query.filter(Task.id.in_(task_ids)).update(
+            {Task.completed_at: datetime.utcnow() - timedelta(days=days)}, synchronize_session=False
+        )
+        db.session.commit()
+
+def run_archive_job(app):
+    with app.app_context():
+        return archive_completed_tasks()
+
+def board_titles(client, project_id):
+    return sorted(task['title'] for task in client.get(f'/api/projects/{project_id}').json['tasks'])
+
+def archived_titles(client, project_id):
+    return sorted(a['title'] for a in client.get(f'/api/projects/{project_id}/archived-tasks').json['items'])
+
+def directory_ids(app, project_id):
+    with app.app_context():
+        return sorted(task_id for (task_id,) in db.session.query(TaskDirectory.task_id).filter_by(project_id=project_id))
+
+def board_ids(client, project_id):
+    return sorted(task['id'] for task in client.get(f'/api/projects/{project_id}').json['tasks'])
+
+def test_archives_tasks_done_longer_than_the_policy(app, client, project_shard):
+    project_id = make_project(client, done_after_days=30)
+    old = [add_task(client, project_id, f'old {i}', 'DONE') for i in range(5)] # Three batches of 2
+    add_task(client, project_id, 'recent', 'DONE')
+    add_task(client, project_id, 'open')
+    complete_days_ago(project_shard, project_id, old, 40)
+
+    assert run_archive_job(app) == 5
+    assert board_titles(client, project_id) == ['open', 'recent']
+    assert archived_titles(client, project_id) == [f'old {i}' for i in range(5)]
+    assert directory_ids(app, project_id) == board_ids(client, project_id) # Archived tasks left the directory
+    assert run_archive_job(app) == 0 # Nothing left to do
+
+def test_disabled_policy_archives_nothing(app, client, project_shard):
+    project_id = make_project(client)
+    task_id = add_task(client, project_id, 'old', 'DONE')
+    complete_days_ago(project_shard, project_id, [task_id], 40)
+    client.put(f'/api/projects/{project_id}/archive-policy', json={'enabled': False})
+
+    assert run_archive_job(app) == 0
+    assert board_titles(client, project_id) == ['old']
+
+def test_task_leaving_done_mid_batch_is_not_archived(app, client, project_shard):
+    project_id = make_project(client)
+    task_ids = [add_task(client, project_id, f'old {i}', 'DONE') for i in range(2)]
+    complete_days_ago(project_shard, project_id, task_ids, 40)
+
+    with app.app_context():
+        shard_router.bind_project(project_id)
+        engine = shard_router.current_engine()
+
+    # Another request moves the first task back to TODO right after the job selected the batch
+    moved = []
+    def move_out_of_done(conn, cursor, statement, parameters, context, executemany):
+        if statement.startswith('INSERT INTO archived_task') and not moved:
+            moved.append(task_ids[0])
+            with engine.begin() as other:
+                other.execute(sa.text("UPDATE task SET status = 'TODO', completed_at = NULL WHERE id = :id"),
+                              {'id': task_ids[0]})
+
+    sa.event.listen(engine, 'before_cursor_execute', move_out_of_done)
+    try:
+        assert run_archive_job(app) == 1
+    finally:
+        sa.event.remove(engine, 'before_cursor_execute', move_out_of_done)
+    assert moved
+
+    assert board_titles(client, project_id) == ['old 0'] # Still on the board, in TODO
+    assert client.get(f'/api/tasks/{task_ids[0]}').json['status'] == 'TODO'
+    assert archived_titles(client, project_id) == ['old 1'] # No stale DONE copy
+    assert directory_ids(app, project_id) == [task_ids[0]]
+
+def test_restore_puts_the_task_back_on_the_board(app, client, project_shard):
+    project_id = make_project(client)
+    task_id = add_task(client, project_id, 'old', 'DONE')
+    complete_days_ago(project_shard, project_id, [task_id], 40)
+    run_archive_job(app)
+
+    archived = client.get(f'/api/projects/{project_id}/archived-tasks').json['items']
+    restored = client.post(f"/api/projects/{project_id}/archived-tasks/{archived[0]['id']}/restore")
+
+    assert restored.status_code == 201
+    assert restored.json['status'] == 'DONE'
+    assert board_titles(client, project_id) == ['old']
+    assert archived_titles(client, project_id) == []
+    assert directory_ids(app, project_id) == [restored.json['id']]
+    assert run_archive_job(app) == 0 # completed_at restarted, so it is not swept straight back
+
+def test_restore_forgets_a_directory_entry_left_by_older_versions(app, client, project_shard):
+    project_id = make_project(client)
+    task_id = add_task(client, project_id, 'old', 'DONE')
+    complete_days_ago(project_shard, project_id, [task_id], 40)
+    run_archive_job(app)
+    with app.app_context():
+        db.session.add(TaskDirectory(task_id=task_id, project_id=project_id))
+        db.session.commit()
+
+    archived = client.get(f'/api/projects/{project_id}/archived-tasks').json['items']
+    restored = client.post(f"/api/projects/{project_id}/archived-tasks/{archived[0]['id']}/restore")
+
+    assert directory_ids(app, project_id) == [restored.json['id']]
+    assert client.get(f'/api/tasks/{task_id}').status_code == 404
@@ -0,0 +1,67 @@
+"""
+Tests for the due-date scanner.
+"""
+
+from datetime import datetime, timedelta
+
+from app.due import scan_due_tasks
+from app.models import DueNotification
+from app.sharding import shard_router
+
+def make_project(client):
+    return client.post('/api/projects', json={'name': 'due'}).json['id']
+
+def add_task(client, project_id, title, due_in_hours, status='TODO'):
+    expiry_date = (datetime.utcnow() + timedelta(hours=due_in_hours)).isoformat()
+    return client.post(f'/api/projects/{project_id}/tasks',
+                       json={'title': title, 'status': status, 'expiry_date': expiry_date}).json['id']
+
+def run_scan(app):
+    with app.app_context():
+        return scan_due_tasks()
+
+def notifications(app):
+    with app.app_context():
+        return sorted(
+            (notification.kind, notification.task_id)
+            for _ in shard_router.each_shard()
+            for notification in DueNotification.query.all()
+        )
+
+def test_scan_records_due_soon_and_overdue_tasks_once(app, client):
+    project_id = make_project(client)
+    soon = add_task(client, project_id, 'soon', 2)
+    late = add_task(client, project_id, 'late', -2)
+    add_task(client, project_id, 'later', 72)
+    add_task(client, project_id, 'done', -2, status='DONE')
+
+    assert run_scan(app) == 3
+    assert notifications(app) == sorted([('due_soon', soon), ('due_soon', late), ('overdue', late)])
+    assert run_scan(app) == 0
+
+def test_deadlines_set_inside_scanned_windows_are_recorded(app, client):
+    project_id = make_project(client)
+    assert run_scan(app) == 0 # Both watermarks are now ahead of the deadlines below
+
+    soon = add_task(client, project_id, 'soon', 2)
+    late = add_task(client, project_id, 'late', -2)
+    moved_up = add_task(client, project_id, 'moved up', 72)
+    expiry_date = (datetime.utcnow() + timedelta(hours=1)).isoformat()
+    client.put(f'/api/tasks/{moved_up}', json={'expiry_date': expiry_date})
+
+    assert run_scan(app) == 3
+    assert notifications(app) == sorted([('due_soon', soon), ('due_soon', moved_up), ('overdue', late)])
+
+    # Sending the same deadline again is not a change
+    client.put(f'/api/tasks/{moved_up}', json={'title': 'renamed', 'expiry_date': expiry_date})
+    assert run_scan(app) == 0
+
+def test_task_reopened_after_its_deadline_is_recorded(app, client):
+    project_id = make_project(client)
+    task_id = add_task(client, project_id, 'reopened', -2, status='DONE')
+    assert run_scan(app) == 0
+
+    client.patch(f'/api/tasks/{task_id}/move', json={'status': 'TODO'})
+
+    assert run_scan(app) == 1
+    assert notifications(app) == [('overdue', task_id)]
@@ -0,0 +1,84 @@
+"""
+Tests for the bulk invite route.
+"""
+
+import sqlalchemy as sa
+
+from app.models import db, User
+
+def make_project(client):
+    return client.post('/api/projects', json={'name': 'team'}).json['id']
+
+def invite(client, project_id, emails, **extra):
+    return client.post(f'/api/projects/{project_id}/members/bulk', json={'emails': emails, **extra})
+
+def member_emails(client, project_id):
+    return sorted(m['email'] for m in client.get(f'/api/projects/{project_id}/members').json['items'])
+
+def user_id(app, email):
+    with app.app_context():
+        return User.query.filter_by(email=email).one().id
+
+def test_bulk_invite_reports_every_outcome(app, client, login):
+    login('alice@example.com')
+    login('bob@example.com')
+    project_id = make_project(client)
+    invite(client, project_id, ['bob@example.com'])
+
+    response = invite(client, project_id, [
+        'alice@example.com', ' alice@example.com ', '', 42, 'ghost@example.com', 'bob@example.com'
+    ])
+
+    assert response.status_code == 200
+    assert response.json['added'] == 1
+    assert [(r['email'], r['status']) for r in response.json['results']] == [
+        ('alice@example.com', 'added'),
+        (' alice@example.com ', 'duplicate'),
+        ('', 'invalid'),
+        (42, 'invalid'),
+        ('ghost@example.com', 'not_found'),
+        ('bob@example.com', 'already_member'),
+    ]
+    assert response.json['results'][0] == {
+        'email': 'alice@example.com', 'status': 'added', 'user_id': user_id(app, 'alice@example.com'), 'role': 'member'
+    }
+    assert member_emails(client, project_id) == ['alice@example.com', 'bob@example.com', 'owner@example.com']
+
+def test_bulk_invite_is_for_owners_and_checks_its_input(client, login):
+    member = login('member@example.com')
+    project_id = make_project(client)
+    invite(client, project_id, ['member@example.com'])
+
+    assert invite(member, project_id, ['owner@example.com']).status_code == 403
+    assert invite(client, project_id, []).status_code == 400
+    assert invite(client, project_id, ['member@example.com'], role='admin').status_code == 400
+
+def test_bulk_invite_skips_users_invited_concurrently(app, client, login):
+    login('alice@example.com')
+    login('bob@example.com')
+    project_id = make_project(client)
+    bob_id = user_id(app, 'bob@example.com')
+
+    with app.app_context():
+        engine = db.engine
+
+    # Another request adds bob right before this one inserts its batch
+    raced = []
+    def invite_bob_first(conn, cursor, statement, parameters, context, executemany):
+        if statement.startswith('INSERT INTO project_members') and not raced:
+            raced.append(bob_id)
+            with engine.begin() as other:
+                other.execute(sa.text("INSERT INTO project_members (user_id, project_id, role) VALUES (:user_id, :project_id, 'member')"),
+                              {'user_id': bob_id, 'project_id': project_id})
+
+    sa.event.listen(engine, 'before_cursor_execute', invite_bob_first)
+    try:
+        response = invite(client, project_id, ['alice@example.com', 'bob@example.com'])
+    finally:
+        sa.event.remove(engine, 'before_cursor_execute', invite_bob_first)
+    assert raced
+
+    assert response.status_code == 200
+    assert response.json['added'] == 1
+    assert [r['status'] for r in response.json['results']] == ['added', 'already_member']
+    assert member_emails(client, project_id) == ['alice@example.com', 'bob@example.com', 'owner@example.com']
@@ -0,0 +1,57 @@
+"""
+Tests for the rate limiter (429) and the concurrency cap (503).
+"""
+
+import pytest
+
+@pytest.fixture
+def app_config():
+    return {
+        'RATELIMIT_ENABLED': True,
+        'RATELIMIT_LIMITS': {'write': '3/minute', 'read': None},
+        'RATELIMIT_IP_LIMITS': {'auth': '4/minute', 'write': '300/minute', 'read': None},
+        'MAX_CONCURRENT_REQUESTS': 1,
+        'ADMISSION_WAIT_SECONDS': 0.01,
+    }
+
+def rejections(app):
+    return dict(app.extensions['rate_limiter'].stats)
+
+def create_project(client):
+    return client.post('/api/projects', json={'name': 'limited'})
+
+def test_empty_user_bucket_gets_a_429_with_retry_after(app, login):
+    alice, bob = login('alice@example.com'), login('bob@example.com') # Same IP
+    before = rejections(app).get('rejected_rate_limit:write', 0)
+
+    assert [create_project(alice).status_code for _ in range(3)] == [201] * 3
+    rejected = create_project(alice)
+    assert rejected.status_code == 429
+    assert 1 <= int(rejected.headers['Retry-After']) <= 20 # One token refills in 20 seconds
+    assert rejections(app)['rejected_rate_limit:write'] == before + 1
+
+    assert alice.get('/api/projects').status_code == 200 # Reads are not limited
+    assert create_project(bob).status_code == 201 # Every user has their own bucket
+
+def test_login_is_limited_per_ip(app):
+    client = app.test_client()
+    attempts = [client.post('/api/login', json={'email': 'nobody@example.com', 'password': 'wrong'}) for _ in range(5)]
+
+    assert [a.status_code for a in attempts] == [401] * 4 + [429]
+    assert 'Retry-After' in attempts[-1].headers
+
+def test_requests_over_the_concurrency_cap_get_a_503(app, client):
+    limiter = app.extensions['rate_limiter']
+    before = rejections(app).get('rejected_overload', 0)
+
+    limiter.slots.acquire() # A request in flight holds the only slot
+    try:
+        shed = client.get('/api/projects')
+    finally:
+        limiter.slots.release()
+
+    assert shed.status_code == 503
+    assert shed.headers['Retry-After'] == '1'
+    assert rejections(app)['rejected_overload'] == before + 1
+    assert client.get('/api/projects').status_code == 200
+    assert limiter.in_flight == 0 # The slot was given back
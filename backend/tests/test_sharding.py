@@ -0,0 +1,84 @@
+"""
+Tests for the shard router, on two SQLite shard databases.
+"""
+
+import pytest
+
+from app.activity import activity_log
+from app.archive import archive_completed_tasks
+from app.models import Task, ArchivePolicy, ArchivedTask, ActivityLog
+from app.sharding import shard_router
+
+def make_project(client, name):
+    """Creates a project with an archive policy, one open task and two DONE tasks."""
+    project_id = client.post('/api/projects', json={'name': name}).json['id']
+    client.put(f'/api/projects/{project_id}/archive-policy', json={'enabled': True, 'done_after_days': 0})
+    open_task_id = client.post(f'/api/projects/{project_id}/tasks', json={'title': f'{name} open'}).json['id']
+    for i in range(2):
+        client.post(f'/api/projects/{project_id}/tasks', json={'title': f'{name} done {i}', 'status': 'DONE'})
+    return project_id, open_task_id
+
+def shard_of(app, project_id):
+    with app.app_context():
+        return shard_router.shard_for_project(project_id)
+
+def test_new_projects_are_spread_over_the_shards(app, client):
+    first, _ = make_project(client, 'first')
+    second, _ = make_project(client, 'second')
+
+    assert {shard_of(app, first), shard_of(app, second)} == {'shard0', 'shard1'}
+
+def test_move_project_with_archive_and_activity(app, client):
+    moved, moved_task_id = make_project(client, 'moved')
+    staying, staying_task_id = make_project(client, 'staying')
+    with app.app_context():
+        assert archive_completed_tasks() == 4
+    assert activity_log.flush() > 0
+
+    source, target = shard_of(app, moved), shard_of(app, staying)
+    assert source != target
+
+    # Every per-shard table now holds rows with the same ids on both shards
+    with app.app_context():
+        copied = shard_router.move_project(moved, target)
+    assert copied > 0
+    assert shard_of(app, moved) == target
+
+    with app.app_context():
+        with shard_router.shard(source):
+            assert Task.query.count() == 0
+            assert ArchivedTask.query.count() == 0
+            assert ArchivePolicy.query.count() == 0
+            assert ActivityLog.query.count() == 0
+        with shard_router.shard(target):
+            assert ArchivePolicy.query.filter_by(project_id=moved).count() == 1
+            assert ArchivePolicy.query.filter_by(project_id=staying).count() == 1
+
+    # Projects and tasks keep their ids, both projects are intact
+    for project_id, task_id, name in ((moved, moved_task_id, 'moved'), (staying, staying_task_id, 'staying')):
+        board = client.get(f'/api/projects/{project_id}')
+        assert board.status_code == 200
+        assert [task['id'] for task in board.json['tasks']] == [task_id]
+        assert client.get(f'/api/tasks/{task_id}').json['title'] == f'{name} open'
+
+        policy = client.get(f'/api/projects/{project_id}/archive-policy').json
+        assert policy == {'project_id': project_id, 'enabled': True, 'done_after_days': 0}
+
+        archived = client.get(f'/api/projects/{project_id}/archived-tasks').json['items']
+        assert sorted(a['title'] for a in archived) == [f'{name} done 0', f'{name} done 1']
+
+        actions = [e['action'] for e in client.get(f'/api/projects/{project_id}/activity').json['items']]
+        assert actions.count('task.created') == 3
+
+    # Archived tasks got new ids on the target shard, restore works with the ids listed there
+    archived = client.get(f'/api/projects/{moved}/archived-tasks').json['items']
+    restored = client.post(f"/api/projects/{moved}/archived-tasks/{archived[0]['id']}/restore")
+    assert restored.status_code == 201
+    assert restored.json['title'] == archived[0]['title']
+
+def test_move_project_rejects_unknown_targets(app, client):
+    project_id, _ = make_project(client, 'project')
+    with app.app_context():
+        with pytest.raises(ValueError):
+            shard_router.move_project(project_id, 'shard9')
+        assert shard_router.move_project(project_id, shard_of(app, project_id)) == 0
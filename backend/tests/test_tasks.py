@@ -0,0 +1,64 @@
+"""
+Tests for the task routes' optimistic concurrency (version checks and 409 responses).
+"""
+
+import sqlalchemy as sa
+
+from app.api import task_routes
+from app.sharding import shard_router
+
+def make_task(client):
+    project_id = client.post('/api/projects', json={'name': 'tasks'}).json['id']
+    return client.post(f'/api/projects/{project_id}/tasks', json={'title': 'task'}).json
+
+def test_writes_bump_the_version(client):
+    task = make_task(client)
+    assert task['version'] == 1
+
+    moved = client.patch(f"/api/tasks/{task['id']}/move", json={'status': 'DONE', 'version': 1})
+    assert moved.status_code == 200
+    assert moved.json['version'] == 2
+
+    assert moved.headers['ETag'] == 'W/"2"' # Weak, the representations differ (fields, compression)
+
+    updated = client.put(f"/api/tasks/{task['id']}", json={'title': 'renamed'}, headers={'If-Match': moved.headers['ETag']})
+    assert updated.status_code == 200
+    assert updated.json['version'] == 3
+    assert client.get(f"/api/tasks/{task['id']}?fields=id").headers['ETag'] == 'W/"3"'
+
+def test_stale_version_gets_a_409_with_the_current_task(client):
+    task = make_task(client)
+    client.put(f"/api/tasks/{task['id']}", json={'title': 'theirs', 'version': 1})
+
+    response = client.put(f"/api/tasks/{task['id']}", json={'title': 'mine', 'version': 1})
+    assert response.status_code == 409
+    assert response.json['task']['title'] == 'theirs'
+    assert response.json['task']['version'] == 2
+
+def test_change_between_select_and_update_gets_a_409(app, client, monkeypatch):
+    task = make_task(client)
+    load_task_for_member = task_routes.load_task_for_member
+
+    # Another request commits a change right after this one loaded the task
+    def load_then_change(task_id, user_id, options=None):
+        loaded = load_task_for_member(task_id, user_id, options)
+        with shard_router.current_engine().begin() as other:
+            other.execute(sa.text("UPDATE task SET title = 'theirs', version = version + 1 WHERE id = :id"),
+                          {'id': task_id})
+        return loaded
+
+    monkeypatch.setattr(task_routes, 'load_task_for_member', load_then_change)
+
+    moved = client.patch(f"/api/tasks/{task['id']}/move", json={'status': 'DONE'})
+    assert moved.status_code == 409
+    assert moved.json['task']['title'] == 'theirs'
+    assert moved.json['task']['status'] == 'TODO'
+
+    updated = client.put(f"/api/tasks/{task['id']}", json={'title': 'mine'})
+    assert updated.status_code == 409
+
+def test_invalid_versions_are_rejected(client):
+    task = make_task(client)
+    for version in ([1], {}, True, '1'):
+        response = client.put(f"/api/tasks/{task['id']}", json={'title': 'x', 'version': version})
+        assert response.status_code == 400
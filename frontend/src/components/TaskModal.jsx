@@ -23,6 +23,7 @@ function TaskModal({ task, projectMembers, onUpdateTask, onClose, onDeleteTask }
         description: description,
         expiry_date: expiryDate || null,
         assignees: assignees,
+        version: task.version, // Rejected with a 409 if someone else changed the task meanwhile
       });
       onUpdateTask(response.data); // Update the task in the parent state
       onClose(); // Close the modal
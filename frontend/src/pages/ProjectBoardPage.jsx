@@ -249,6 +249,7 @@ const handleCreateTask = async (e) => {
     api.patch(`/tasks/${activeTask.id}/move`, {
         status: overColumnId,
         order: newIndex,
+        version: activeTask.version, // Rejected with a 409 if someone else changed the task meanwhile
       })
       .then(response => {
         handleUpdateTask(response.data);